@@ -2,6 +2,8 @@
 Bot configuration and constants
 """
 
+from bisect import bisect_right
+
 class BotConfig:
     """Configuration class for the bot"""
     
@@ -25,6 +27,10 @@ class BotConfig:
         }
     }
     
+    # Known users indexed by lowercased handle without the @ for direct lookups
+    _KNOWN_USERS_LOWER = {handle.lstrip('@').lower(): info
+                          for handle, info in KNOWN_USERS.items()}
+    
     # Educational topics
     LEARNING_TOPICS = [
         'cryptocurrency_basics',
@@ -46,14 +52,19 @@ class BotConfig:
         'expert': 90
     }
     
+    # Milestones sorted by score threshold for bisection
+    _MILESTONE_THRESHOLDS = sorted(PROGRESS_MILESTONES.values())
+    _MILESTONE_NAMES = [name for name, _ in sorted(PROGRESS_MILESTONES.items(),
+                                                   key=lambda item: item[1])]
+    
     # Quiz difficulty levels
     QUIZ_LEVELS = ['easy', 'medium', 'hard']
     
     # Data file paths
     DATA_PATHS = {
-        'users': 'data/users.json',
+        'users': 'data/users',
         'memories': 'data/memories.json',
-        'progress': 'data/progress.json'
+        'progress': 'data/progress'
     }
     
     @classmethod
@@ -63,15 +74,25 @@ class BotConfig:
             return None
         
         # Handle both @username and username formats
-        search_username = username if username.startswith('@') else f"@{username}"
-        
-        for handle, info in cls.KNOWN_USERS.items():
-            if handle.lower() == search_username.lower():
-                return info
-        return None
+        return cls._KNOWN_USERS_LOWER.get(username.lstrip('@').lower())
     
     @classmethod
     def is_admin(cls, username):
         """Check if user is admin"""
         user_info = cls.get_user_by_username(username)
         return user_info and user_info.get('role') == 'admin'
+    
+    @classmethod
+    def level_for_score(cls, score):
+        """Get the progress milestone reached with a score"""
+        index = bisect_right(cls._MILESTONE_THRESHOLDS, score) - 1
+        return cls._MILESTONE_NAMES[max(index, 0)]
+
+_bot_config = None
+
+def get_bot_config() -> BotConfig:
+    """Get the shared bot configuration, creating it on first use"""
+    global _bot_config
+    if _bot_config is None:
+        _bot_config = BotConfig()
+    return _bot_config
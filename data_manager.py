@@ -2,85 +2,470 @@
 Data manager for persistent storage using JSON files
 """
 
+import atexit
+import hashlib
 import json
 import os
 import logging
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, NamedTuple, Optional, Set, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# ioctl request for a copy-on-write clone (Linux, btrfs/xfs)
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409)
+
+def _copy_file(src: str, dst: str):
+    """Copy a file in the kernel, falling back to a userspace copy"""
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                if not fcntl:
+                    raise OSError("fcntl not available")
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                # No reflink support, let the kernel copy the bytes instead
+                size = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset,
+                                       size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+        shutil.copystat(src, dst)
+    except (OSError, AttributeError):
+        shutil.copy2(src, dst)
+
+class Snapshot(NamedTuple):
+    """All users and progress read together, shared by bulk views"""
+    users: Dict
+    progress: Dict
+    taken_at: float
+
 class DataManager:
     """Manages persistent data storage for the bot"""
     
+    __slots__ = ('data_dir', 'users_dir', 'memories_file', 'progress_dir',
+                 'group_memories_file', 'memories_log_file', '_log_backed_files',
+                 '_cache', '_mtimes', '_checked_at', '_cache_lock',
+                 '_written_digests', '_dirty', '_flushing', '_dirty_lock',
+                 '_flush_lock',
+                 '_log_lock', '_shard_keys', '_memories_log', '_flush_thread',
+                 '_snapshot')
+    
+    # Seconds between background flushes of modified files; repeated updates
+    # to a file within this window are written once
+    FLUSH_INTERVAL = 2.0
+    
+    # Indentation for written files; None writes compact JSON
+    JSON_INDENT = None
+    
+    # Buffer size for file writes, so a flush needs few write() calls
+    WRITE_BUFFER_SIZE = 1 << 16
+    
+    # Reload cached files that were changed on disk by another process
+    VALIDATE_CACHE = True
+    
+    # Seconds a cached file is trusted before its modification time is checked
+    CACHE_TTL = 30
+    
+    # Number of conversations kept per user and per group chat
+    MAX_USER_MEMORIES = 50
+    MAX_GROUP_MEMORIES = 100
+    
+    # Maximum number of parsed files kept in memory
+    CACHE_MAX_SIZE = 1024
+    
+    # Conversation log size that triggers rewriting the memory snapshots
+    MEMORIES_LOG_MAX_SIZE = 1 << 20
+    
+    # Seconds a snapshot of all users and progress is reused
+    SNAPSHOT_TTL = 1.0
+    
     def __init__(self):
         self.data_dir = 'data'
         self.ensure_data_directory()
-        self.users_file = os.path.join(self.data_dir, 'users.json')
+        self.users_dir = os.path.join(self.data_dir, 'users')
         self.memories_file = os.path.join(self.data_dir, 'memories.json')
-        self.progress_file = os.path.join(self.data_dir, 'progress.json')
+        self.progress_dir = os.path.join(self.data_dir, 'progress')
         self.group_memories_file = os.path.join(self.data_dir, 'group_memories.json')
+        self.memories_log_file = os.path.join(self.data_dir, 'memories.jsonl')
+        
+        # Memory snapshots are only current together with the conversation log
+        self._log_backed_files = {self.memories_file, self.group_memories_file}
+        
+        # Parsed file contents keyed by path in least recently used order,
+        # so reads don't hit the disk
+        self._cache: OrderedDict[str, Dict] = OrderedDict()
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._checked_at: Dict[str, float] = {}
+        # Guards the cache against the bot's worker threads
+        self._cache_lock = threading.RLock()
+        
+        # Modification time and digest of the content last written to each file
+        self._written_digests: Dict[str, Tuple[Optional[int], bytes]] = {}
+        
+        # Paths modified since the last flush, and those a running flush
+        # hasn't written yet; both stay cached until they are on disk
+        self._dirty: Set[str] = set()
+        self._flushing: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        
+        # Keys of the per-user shard files in each shard directory
+        self._shard_keys: Dict[str, Set[str]] = {}
+        
+        # Last result of get_snapshot, dropped whenever a shard is saved
+        self._snapshot: Optional[Snapshot] = None
         
         # Initialize files if they don't exist
         self.initialize_data_files()
+        self.initialize_shard_directory(self.users_dir,
+                                        os.path.join(self.data_dir, 'users.json'))
+        self.initialize_shard_directory(self.progress_dir,
+                                        os.path.join(self.data_dir, 'progress.json'))
+        
+        # Conversations are appended to a log between snapshot rewrites
+        self._replay_memories_log()
+        self._memories_log = open(self.memories_log_file, 'ab',
+                                  buffering=self.WRITE_BUFFER_SIZE)
+        
+        # Write modified files in the background and once more at exit
+        self._flush_thread = threading.Thread(target=self._flush_loop,
+                                              name='DataManagerFlush',
+                                              daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.flush)
     
     def ensure_data_directory(self):
         """Ensure data directory exists"""
-        if not os.path.exists(self.data_dir):
+        try:
             os.makedirs(self.data_dir)
             logger.info(f"Created data directory: {self.data_dir}")
+        except FileExistsError:
+            pass
     
     def initialize_data_files(self):
         """Initialize data files with empty structures"""
         files_to_init = [
-            (self.users_file, {}),
-            (self.memories_file, {}),
-            (self.progress_file, {}),
-            (self.group_memories_file, {})
+            self.memories_file,
+            self.group_memories_file
         ]
         
-        for file_path, default_data in files_to_init:
-            if not os.path.exists(file_path):
-                self.save_json_file(file_path, default_data)
-                logger.info(f"Initialized data file: {file_path}")
+        for file_path in files_to_init:
+            # Create the file only if it is missing, without a separate exists check
+            try:
+                fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                continue
+            try:
+                os.write(fd, b'{}')
+            finally:
+                os.close(fd)
+            logger.info(f"Initialized data file: {file_path}")
+    
+    def initialize_shard_directory(self, shard_dir: str, legacy_file: str):
+        """Create a per-user shard directory, splitting up a legacy data file"""
+        try:
+            os.makedirs(shard_dir)
+            logger.info(f"Created data directory: {shard_dir}")
+        except FileExistsError:
+            pass
+        
+        if os.path.exists(legacy_file):
+            for key, value in self.load_json_file(legacy_file).items():
+                self._write_json_file(self._shard_path(shard_dir, key), value)
+            os.replace(legacy_file, legacy_file + '.migrated')
+            self._cache.pop(legacy_file, None)
+            self._mtimes.pop(legacy_file, None)
+            self._checked_at.pop(legacy_file, None)
+            logger.info(f"Migrated {legacy_file} to {shard_dir}")
+        
+        self._shard_keys[shard_dir] = {
+            entry.name[:-len('.json')]
+            for entry in os.scandir(shard_dir)
+            if entry.name.endswith('.json')
+        }
+    
+    def _shard_path(self, shard_dir: str, key) -> str:
+        """Get the shard file path for a key"""
+        return os.path.join(shard_dir, f"{key}.json")
+    
+    def _load_shards(self, shard_dir: str) -> Dict:
+        """Load all shards of a directory into a dict keyed by shard key"""
+        return {
+            key: self.load_json_file(self._shard_path(shard_dir, key))
+            for key in sorted(self._shard_keys[shard_dir])
+        }
+    
+    def _save_shard(self, shard_dir: str, key, data: Dict):
+        """Save a single shard"""
+        self._shard_keys[shard_dir].add(str(key))
+        self.save_json_file(self._shard_path(shard_dir, key), data)
+        self._snapshot = None
     
     def load_json_file(self, file_path: str) -> Dict:
-        """Load data from JSON file"""
+        """Load data from JSON file, reading the disk only when it has changed"""
+        with self._cache_lock:
+            data = self._get_cached(file_path)
+        if data is not None:
+            return data
+        
+        # Read and parse outside the lock, so lookups of other files overlap
+        mtime = self._get_mtime(file_path)
+        data = {}
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+            # A missing file has no modification time
+            if mtime is not None:
+                # Both parsers take the raw bytes, so there's no text decoding step
+                with open(file_path, 'rb') as f:
+                    blob = f.read()
+                data = orjson.loads(blob) if orjson else json.loads(blob)
         except Exception as e:
             logger.error(f"Error loading {file_path}: {e}")
             return {}
+        
+        with self._cache_lock:
+            # Keep what another thread loaded or saved meanwhile, so every
+            # caller modifies the same dict
+            if file_path in self._cache and (self._is_pinned(file_path)
+                                             or self._mtimes.get(file_path) == mtime):
+                self._cache.move_to_end(file_path)
+                return self._cache[file_path]
+            
+            self._cache[file_path] = data
+            self._cache.move_to_end(file_path)
+            self._mtimes[file_path] = mtime
+            self._checked_at[file_path] = time.monotonic()
+            self._evict_cache()
+        return data
+    
+    def _get_cached(self, file_path: str) -> Optional[Dict]:
+        """Get a file's cached data if still current, holding the cache lock"""
+        if file_path not in self._cache:
+            return None
+        
+        # Unflushed changes always win over the file on disk
+        fresh = not self.VALIDATE_CACHE or self._is_pinned(file_path)
+        if not fresh:
+            # Recently checked files are served without a stat() call
+            now = time.monotonic()
+            fresh = now - self._checked_at.get(file_path, -self.CACHE_TTL) < self.CACHE_TTL
+        if not fresh:
+            fresh = self._get_mtime(file_path) == self._mtimes.get(file_path)
+            if fresh:
+                self._checked_at[file_path] = now
+        if not fresh:
+            return None
+        
+        self._cache.move_to_end(file_path)
+        data = self._cache[file_path]
+        # Files flushed since they were saved can be evicted now
+        self._evict_cache()
+        return data
+    
+    def _is_pinned(self, file_path: str) -> bool:
+        """Check if a cached file holds data that isn't on disk yet"""
+        return (file_path in self._dirty or file_path in self._flushing
+                or file_path in self._log_backed_files)
+    
+    def _evict_cache(self):
+        """Drop least recently used files from the cache beyond CACHE_MAX_SIZE"""
+        excess = len(self._cache) - self.CACHE_MAX_SIZE
+        if excess <= 0:
+            return
+        
+        # Files with unflushed changes stay cached until they are written
+        evicted = []
+        for file_path in self._cache:
+            if excess <= 0:
+                break
+            if self._is_pinned(file_path):
+                continue
+            evicted.append(file_path)
+            excess -= 1
+        
+        for file_path in evicted:
+            del self._cache[file_path]
+            self._mtimes.pop(file_path, None)
+            self._checked_at.pop(file_path, None)
+    
+    def _get_mtime(self, file_path: str) -> Optional[int]:
+        """Get file modification time in nanoseconds, or None if missing"""
+        try:
+            return os.stat(file_path).st_mtime_ns
+        except OSError:
+            return None
     
     def save_json_file(self, file_path: str, data: Dict):
-        """Save data to JSON file"""
+        """Save data to JSON file on the next flush"""
+        with self._cache_lock:
+            self._cache[file_path] = data
+            self._cache.move_to_end(file_path)
+            with self._dirty_lock:
+                self._dirty.add(file_path)
+            self._evict_cache()
+    
+    def _write_json_file(self, file_path: str, data: Dict):
+        """Atomically write data to JSON file, skipping unchanged content"""
+        if orjson:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.JSON_INDENT:
+                option |= orjson.OPT_INDENT_2
+            blob = orjson.dumps(data, default=list, option=option)
+        else:
+            blob = json.dumps(data, indent=self.JSON_INDENT, ensure_ascii=False,
+                              default=list).encode('utf-8')
+        
+        # Skip the write if the file still holds exactly what we last wrote;
+        # a stat is much cheaper than the write and fsync it can save
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        mtime = self._get_mtime(file_path)
+        if mtime is not None and self._written_digests.get(file_path) == (mtime, digest):
+            return
+        
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb', buffering=self.WRITE_BUFFER_SIZE) as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        # Swap the complete file in so a crash never leaves it half-written
+        os.replace(tmp_path, file_path)
+        mtime = self._get_mtime(file_path)
+        self._mtimes[file_path] = mtime
+        self._checked_at[file_path] = time.monotonic()
+        self._written_digests[file_path] = (mtime, digest)
+    
+    def flush(self):
+        """Write all modified files to disk"""
+        with self._flush_lock:
+            # Pin the files in the cache while taking them, so loads during
+            # the writes can't evict changes that aren't on disk yet
+            with self._cache_lock:
+                with self._dirty_lock:
+                    dirty, self._dirty = self._dirty, set()
+                self._flushing = dirty - self._log_backed_files
+            
+            memory_files = dirty & self._log_backed_files
+            if memory_files or self._memories_log.tell() >= self.MEMORIES_LOG_MAX_SIZE:
+                dirty -= memory_files
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"Error compacting {self.memories_log_file}: {e}")
+                    with self._dirty_lock:
+                        self._dirty |= memory_files
+            
+            for file_path in dirty:
+                try:
+                    with self._cache_lock:
+                        data = self._cache[file_path]
+                    self._write_json_file(file_path, data)
+                except Exception as e:
+                    logger.error(f"Error saving {file_path}: {e}")
+                    # Retry on the next flush
+                    with self._dirty_lock:
+                        self._dirty.add(file_path)
+                finally:
+                    with self._cache_lock:
+                        self._flushing.discard(file_path)
+            
+            try:
+                self._memories_log.flush()
+            except Exception as e:
+                logger.error(f"Error saving {self.memories_log_file}: {e}")
+    
+    def compact(self):
+        """Rewrite the memory snapshots and truncate the conversation log"""
+        with self._log_lock:
+            for file_path in self._log_backed_files:
+                self._write_json_file(file_path, self.load_json_file(file_path))
+            with self._dirty_lock:
+                self._dirty -= self._log_backed_files
+            
+            self._memories_log.truncate(0)
+            self._memories_log.seek(0)
+    
+    def _append_memory_log(self, kind: str, key: str, conversation_data: Dict):
+        """Append a stored conversation to the conversation log"""
+        record = {'kind': kind, 'key': key, 'entry': conversation_data}
+        if orjson:
+            line = orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        self._memories_log.write(line + b'\n')
+    
+    def _replay_memories_log(self):
+        """Apply conversations logged since the last snapshot to the cache"""
+        targets = {
+            'user': (self.get_memories_data(), self.MAX_USER_MEMORIES),
+            'group': (self.get_group_memories_data(), self.MAX_GROUP_MEMORIES)
+        }
+        replayed = 0
+        
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Error saving {file_path}: {e}")
+            with open(self.memories_log_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line) if orjson else json.loads(line)
+                        memories_data, maxlen = targets[record['kind']]
+                        buffer = self._get_memory_buffer(memories_data,
+                                                         record['key'], maxlen)
+                    except Exception:
+                        # A crash can leave a partially written last line
+                        logger.warning(f"Skipping malformed entry in {self.memories_log_file}")
+                        continue
+                    
+                    # Entries can already be in the snapshot if a compaction was interrupted
+                    if record['entry'] not in buffer:
+                        buffer.append(record['entry'])
+                        replayed += 1
+        except FileNotFoundError:
+            return
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} conversations from {self.memories_log_file}")
+    
+    def _flush_loop(self):
+        """Periodically flush modified files"""
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
     
     def get_users_data(self) -> Dict:
         """Get all users data"""
-        return self.load_json_file(self.users_file)
+        return self._load_shards(self.users_dir)
     
     def save_users_data(self, data: Dict):
         """Save users data"""
-        self.save_json_file(self.users_file, data)
+        for user_id, user_data in data.items():
+            self._save_shard(self.users_dir, user_id, user_data)
     
     def get_user_data(self, user_id: int) -> Dict:
         """Get specific user data"""
-        users_data = self.get_users_data()
-        return users_data.get(str(user_id), {})
+        return self.load_json_file(self._shard_path(self.users_dir, user_id))
     
     def save_user_data(self, user_id: int, user_data: Dict):
         """Save specific user data"""
-        users_data = self.get_users_data()
-        users_data[str(user_id)] = user_data
-        self.save_users_data(users_data)
+        self._save_shard(self.users_dir, user_id, user_data)
     
     def get_memories_data(self) -> Dict:
         """Get all memories data"""
@@ -88,30 +473,29 @@ class DataManager:
     
     def save_memories_data(self, data: Dict):
         """Save memories data"""
-        self.save_json_file(self.memories_file, data)
+        with self._log_lock:
+            self.save_json_file(self.memories_file, data)
     
-    def get_user_memories(self, user_id: int) -> List[Dict]:
-        """Get conversation memories for a user"""
+    def get_user_memories(self, user_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """Get conversation memories for a user, optionally only the last few"""
         memories_data = self.get_memories_data()
-        return memories_data.get(str(user_id), [])
+        with self._log_lock:
+            return self._tail(memories_data.get(str(user_id), []), limit)
     
     def store_conversation(self, user_id: int, conversation_data: Dict):
         """Store a conversation in memories"""
         memories_data = self.get_memories_data()
-        user_memories = memories_data.get(str(user_id), [])
         
         # Add timestamp if not present
         if 'timestamp' not in conversation_data:
             conversation_data['timestamp'] = datetime.now().isoformat()
         
-        user_memories.append(conversation_data)
-        
-        # Keep only last 50 conversations to manage memory
-        if len(user_memories) > 50:
-            user_memories = user_memories[-50:]
-        
-        memories_data[str(user_id)] = user_memories
-        self.save_memories_data(memories_data)
+        # The buffer keeps only the last 50 conversations
+        with self._log_lock:
+            user_memories = self._get_memory_buffer(memories_data, str(user_id),
+                                                    self.MAX_USER_MEMORIES)
+            user_memories.append(conversation_data)
+            self._append_memory_log('user', str(user_id), conversation_data)
     
     def get_group_memories_data(self) -> Dict:
         """Get all group memories data"""
@@ -119,72 +503,107 @@ class DataManager:
     
     def save_group_memories_data(self, data: Dict):
         """Save group memories data"""
-        self.save_json_file(self.group_memories_file, data)
+        with self._log_lock:
+            self.save_json_file(self.group_memories_file, data)
     
-    def get_group_memories(self, chat_id: int) -> List[Dict]:
-        """Get conversation memories for a group chat"""
+    def get_group_memories(self, chat_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """Get conversation memories for a group chat, optionally only the last few"""
         group_memories_data = self.get_group_memories_data()
-        return group_memories_data.get(str(chat_id), [])
+        with self._log_lock:
+            return self._tail(group_memories_data.get(str(chat_id), []), limit)
     
     def store_group_conversation(self, chat_id: int, conversation_data: Dict):
         """Store a group conversation in memories"""
         group_memories_data = self.get_group_memories_data()
-        group_memories = group_memories_data.get(str(chat_id), [])
         
         # Add timestamp if not present
         if 'timestamp' not in conversation_data:
             conversation_data['timestamp'] = datetime.now().isoformat()
         
-        group_memories.append(conversation_data)
-        
-        # Keep only last 100 group conversations to manage memory
-        if len(group_memories) > 100:
-            group_memories = group_memories[-100:]
-        
-        group_memories_data[str(chat_id)] = group_memories
-        self.save_group_memories_data(group_memories_data)
+        # The buffer keeps only the last 100 group conversations
+        with self._log_lock:
+            group_memories = self._get_memory_buffer(group_memories_data,
+                                                     str(chat_id),
+                                                     self.MAX_GROUP_MEMORIES)
+            group_memories.append(conversation_data)
+            self._append_memory_log('group', str(chat_id), conversation_data)
+    
+    def _tail(self, memories, limit: Optional[int]) -> List[Dict]:
+        """Copy the last limit conversations, without walking the whole buffer"""
+        if limit is None:
+            return list(memories)
+        recent = list(islice(reversed(memories), limit))
+        recent.reverse()
+        return recent
+    
+    def _get_memory_buffer(self, memories_data: Dict, key: str, maxlen: int) -> deque:
+        """Get a bounded conversation buffer, converting loaded lists in place"""
+        buffer = memories_data.get(key)
+        if not isinstance(buffer, deque):
+            buffer = deque(buffer or [], maxlen=maxlen)
+            memories_data[key] = buffer
+        return buffer
     
     def get_progress_data(self) -> Dict:
         """Get all progress data"""
-        return self.load_json_file(self.progress_file)
+        return self._load_shards(self.progress_dir)
     
     def save_progress_data(self, data: Dict):
         """Save progress data"""
-        self.save_json_file(self.progress_file, data)
+        for user_id, progress_data in data.items():
+            self._save_shard(self.progress_dir, user_id, progress_data)
     
     def get_user_progress(self, user_id: int) -> Dict:
         """Get user progress data"""
-        progress_data = self.get_progress_data()
-        return progress_data.get(str(user_id), {})
+        return self.load_json_file(self._shard_path(self.progress_dir, user_id))
     
     def save_user_progress(self, user_id: int, progress_data: Dict):
         """Save user progress data"""
-        all_progress = self.get_progress_data()
-        all_progress[str(user_id)] = progress_data
-        self.save_progress_data(all_progress)
+        self._save_shard(self.progress_dir, user_id, progress_data)
+    
+    def get_snapshot(self) -> Snapshot:
+        """Get all users and progress, reusing a recent read; treat as read-only"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is None or now - snapshot.taken_at >= self.SNAPSHOT_TTL:
+            snapshot = Snapshot(self.get_users_data(), self.get_progress_data(), now)
+            self._snapshot = snapshot
+        return snapshot
     
-    def backup_data(self):
-        """Create backup of all data files"""
+    def backup_data(self) -> threading.Thread:
+        """Create backup of all data files in a background thread"""
+        backup_thread = threading.Thread(target=self._backup_files,
+                                         name='DataManagerBackup',
+                                         daemon=True)
+        backup_thread.start()
+        return backup_thread
+    
+    def _backup_files(self):
+        """Copy all data files to a timestamped backup"""
+        self.flush()
+        self.compact()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_dir = os.path.join(self.data_dir, 'backups')
         
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
+        os.makedirs(backup_dir, exist_ok=True)
         
         files_to_backup = [
-            self.users_file,
-            self.memories_file,
-            self.progress_file
+            (self.memories_file, os.path.join(backup_dir, f"{timestamp}_memories.json"))
         ]
+        for shard_dir in (self.users_dir, self.progress_dir):
+            shard_backup_dir = os.path.join(
+                backup_dir, f"{timestamp}_{os.path.basename(shard_dir)}")
+            os.makedirs(shard_backup_dir, exist_ok=True)
+            for key in list(self._shard_keys[shard_dir]):
+                files_to_backup.append((
+                    self._shard_path(shard_dir, key),
+                    self._shard_path(shard_backup_dir, key)
+                ))
         
-        for file_path in files_to_backup:
+        for file_path, backup_path in files_to_backup:
             if os.path.exists(file_path):
-                filename = os.path.basename(file_path)
-                backup_path = os.path.join(backup_dir, f"{timestamp}_{filename}")
-                
                 try:
-                    import shutil
-                    shutil.copy2(file_path, backup_path)
+                    _copy_file(file_path, backup_path)
                     logger.info(f"Backed up {file_path} to {backup_path}")
                 except Exception as e:
                     logger.error(f"Error backing up {file_path}: {e}")
@@ -194,21 +613,27 @@ class DataManager:
         cutoff_date = datetime.now().timestamp() - (days_to_keep * 24 * 60 * 60)
         
         memories_data = self.get_memories_data()
-        cleaned_data = {}
         
-        for user_id, conversations in memories_data.items():
-            cleaned_conversations = []
-            
-            for conversation in conversations:
-                try:
-                    conv_timestamp = datetime.fromisoformat(conversation['timestamp']).timestamp()
-                    if conv_timestamp > cutoff_date:
+        # Conversations stored meanwhile must neither break the iteration nor
+        # be dropped, so filter the buffers in place under the log lock
+        with self._log_lock:
+            for user_id, conversations in memories_data.items():
+                cleaned_conversations = []
+                
+                # Conversations can be stored out of order, so check each one
+                for conversation in conversations:
+                    try:
+                        conv_timestamp = datetime.fromisoformat(conversation['timestamp']).timestamp()
+                        if conv_timestamp > cutoff_date:
+                            cleaned_conversations.append(conversation)
+                    except (KeyError, TypeError, ValueError):
+                        # Keep conversations without valid timestamps
                         cleaned_conversations.append(conversation)
-                except:
-                    # Keep conversations without valid timestamps
-                    cleaned_conversations.append(conversation)
+                
+                memories_data[user_id] = deque(cleaned_conversations,
+                                               maxlen=self.MAX_USER_MEMORIES)
             
-            cleaned_data[user_id] = cleaned_conversations
+            # save_memories_data would take the log lock again
+            self.save_json_file(self.memories_file, memories_data)
         
-        self.save_memories_data(cleaned_data)
         logger.info(f"Cleaned up conversation data older than {days_to_keep} days")
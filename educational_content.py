@@ -3,146 +3,12 @@ Educational content for crypto and stocks learning
 """
 
 import random
+from collections import defaultdict
+from datetime import date
 from typing import Dict, List
 
-class EducationalContent:
-    """Manages educational content for crypto and stocks"""
-    
-    def __init__(self):
-        self.learning_modules = self._initialize_learning_modules()
-        self.quiz_questions = self._initialize_quiz_questions()
-    
-    def _initialize_learning_modules(self) -> Dict:
-        """Initialize learning modules"""
-        return {
-            'crypto_basics': {
-                'title': 'Cryptocurrency Basics',
-                'description': 'Learn the fundamentals of cryptocurrency',
-                'content': self._get_crypto_basics_content(),
-                'difficulty': 'beginner',
-                'estimated_time': '15 minutes'
-            },
-            'blockchain': {
-                'title': 'Blockchain Technology',
-                'description': 'Understanding how blockchain works',
-                'content': self._get_blockchain_content(),
-                'difficulty': 'intermediate',
-                'estimated_time': '20 minutes'
-            },
-            'stocks_basics': {
-                'title': 'Stock Market Fundamentals',
-                'description': 'Learn the basics of stock trading',
-                'content': self._get_stocks_basics_content(),
-                'difficulty': 'beginner',
-                'estimated_time': '15 minutes'
-            },
-            'technical_analysis': {
-                'title': 'Technical Analysis',
-                'description': 'Chart reading and technical indicators',
-                'content': self._get_technical_analysis_content(),
-                'difficulty': 'intermediate',
-                'estimated_time': '25 minutes'
-            },
-            'risk_management': {
-                'title': 'Risk Management',
-                'description': 'Managing risk in trading and investing',
-                'content': self._get_risk_management_content(),
-                'difficulty': 'intermediate',
-                'estimated_time': '20 minutes'
-            }
-        }
-    
-    def _initialize_quiz_questions(self) -> List[Dict]:
-        """Initialize quiz questions"""
-        return [
-            {
-                'topic': 'crypto',
-                'difficulty': 'easy',
-                'question': 'What is Bitcoin?',
-                'options': [
-                    'A digital currency',
-                    'A physical coin',
-                    'A bank',
-                    'A government program'
-                ],
-                'correct_answer': 0,
-                'explanation': 'Bitcoin is a decentralized digital currency that operates without a central bank.'
-            },
-            {
-                'topic': 'crypto',
-                'difficulty': 'medium',
-                'question': 'What is a blockchain?',
-                'options': [
-                    'A type of cryptocurrency',
-                    'A distributed ledger technology',
-                    'A trading platform',
-                    'A wallet app'
-                ],
-                'correct_answer': 1,
-                'explanation': 'Blockchain is a distributed ledger technology that maintains a continuously growing list of records.'
-            },
-            {
-                'topic': 'stocks',
-                'difficulty': 'easy',
-                'question': 'What does P/E ratio stand for?',
-                'options': [
-                    'Price to Equity',
-                    'Price to Earnings',
-                    'Profit to Equity',
-                    'Profit to Earnings'
-                ],
-                'correct_answer': 1,
-                'explanation': 'P/E ratio stands for Price-to-Earnings ratio, which compares stock price to earnings per share.'
-            },
-            {
-                'topic': 'stocks',
-                'difficulty': 'medium',
-                'question': 'What is market capitalization?',
-                'options': [
-                    'Total debt of a company',
-                    'Total value of company shares',
-                    'Annual revenue',
-                    'Number of employees'
-                ],
-                'correct_answer': 1,
-                'explanation': 'Market cap is the total value of all company shares, calculated as share price × number of shares.'
-            }
-        ]
-    
-    def get_learning_modules(self) -> Dict:
-        """Get all learning modules"""
-        return self.learning_modules
-    
-    def get_module_content(self, module_id: str) -> str:
-        """Get content for a specific module"""
-        module = self.learning_modules.get(module_id)
-        if module:
-            return module['content']
-        return "Module not found."
-    
-    def get_crypto_basics(self) -> str:
-        """Get cryptocurrency basics content"""
-        return self._get_crypto_basics_content()
-    
-    def get_stocks_basics(self) -> str:
-        """Get stocks basics content"""
-        return self._get_stocks_basics_content()
-    
-    def get_blockchain_content(self) -> str:
-        """Get blockchain content"""
-        return self._get_blockchain_content()
-    
-    def get_technical_analysis_content(self) -> str:
-        """Get technical analysis content"""  
-        return self._get_technical_analysis_content()
-    
-    def get_risk_management_content(self) -> str:
-        """Get risk management content"""
-        return self._get_risk_management_content()
-    
-    def _get_crypto_basics_content(self) -> str:
-        """Cryptocurrency basics content"""
-        return """
+# Cryptocurrency basics content
+_CRYPTO_BASICS_CONTENT = """
 🪙 **Cryptocurrency Basics**
 
 **What is Cryptocurrency?**
@@ -173,11 +39,10 @@ Cryptocurrency is a digital or virtual currency secured by cryptography. Unlike
 📈 Start small and learn gradually
 
 Ready to learn more? Ask me about blockchain technology or any crypto concept!
-        """
-    
-    def _get_stocks_basics_content(self) -> str:
-        """Stocks basics content"""
-        return """
+"""
+
+# Stocks basics content
+_STOCKS_BASICS_CONTENT = """
 📈 **Stock Market Fundamentals**
 
 **What are Stocks?**
@@ -215,11 +80,10 @@ Stocks represent ownership shares in a company. When you buy stock, you become a
 • 🎯 **Diversification**: Don't put all eggs in one basket
 
 Want to learn about technical analysis or risk management? Just ask!
-        """
-    
-    def _get_blockchain_content(self) -> str:
-        """Blockchain technology content"""
-        return """
+"""
+
+# Blockchain technology content
+_BLOCKCHAIN_CONTENT = """
 ⛓️ **Blockchain Technology**
 
 **What is Blockchain?**
@@ -247,11 +111,10 @@ A blockchain is a distributed ledger that maintains a continuously growing list
 • 🎨 Digital art (NFTs)
 
 This technology powers all cryptocurrencies and has many other uses!
-        """
-    
-    def _get_technical_analysis_content(self) -> str:
-        """Technical analysis content"""
-        return """
+"""
+
+# Technical analysis content
+_TECHNICAL_ANALYSIS_CONTENT = """
 📊 **Technical Analysis**
 
 **What is Technical Analysis?**
@@ -275,11 +138,10 @@ The study of price charts and trading volume to predict future price movements b
 • 📉 **Bar Charts**: Similar to candlesticks, different format
 
 Remember: Technical analysis is a tool, not a guarantee!
-        """
-    
-    def _get_risk_management_content(self) -> str:
-        """Risk management content"""
-        return """
+"""
+
+# Risk management content
+_RISK_MANAGEMENT_CONTENT = """
 🛡️ **Risk Management**
 
 **Why Risk Management Matters:**
@@ -306,26 +168,172 @@ Never risk more than 1% of your portfolio on a single trade.
 • 📚 **Keep Learning**: Knowledge reduces risk
 
 Risk management is your financial safety net!
-        """
+"""
+
+def _index_by_topic(questions: List[Dict]) -> Dict[str, List[Dict]]:
+    """Group quiz questions by topic"""
+    index = defaultdict(list)
+    for question in questions:
+        index[question['topic']].append(question)
+    return dict(index)
+
+class EducationalContent:
+    """Manages educational content for crypto and stocks"""
+    
+    # All content is shared class data, so instances hold no attributes
+    __slots__ = ()
+    
+    # Learning modules
+    LEARNING_MODULES = {
+        'crypto_basics': {
+            'title': 'Cryptocurrency Basics',
+            'description': 'Learn the fundamentals of cryptocurrency',
+            'content': _CRYPTO_BASICS_CONTENT,
+            'difficulty': 'beginner',
+            'estimated_time': '15 minutes'
+        },
+        'blockchain': {
+            'title': 'Blockchain Technology',
+            'description': 'Understanding how blockchain works',
+            'content': _BLOCKCHAIN_CONTENT,
+            'difficulty': 'intermediate',
+            'estimated_time': '20 minutes'
+        },
+        'stocks_basics': {
+            'title': 'Stock Market Fundamentals',
+            'description': 'Learn the basics of stock trading',
+            'content': _STOCKS_BASICS_CONTENT,
+            'difficulty': 'beginner',
+            'estimated_time': '15 minutes'
+        },
+        'technical_analysis': {
+            'title': 'Technical Analysis',
+            'description': 'Chart reading and technical indicators',
+            'content': _TECHNICAL_ANALYSIS_CONTENT,
+            'difficulty': 'intermediate',
+            'estimated_time': '25 minutes'
+        },
+        'risk_management': {
+            'title': 'Risk Management',
+            'description': 'Managing risk in trading and investing',
+            'content': _RISK_MANAGEMENT_CONTENT,
+            'difficulty': 'intermediate',
+            'estimated_time': '20 minutes'
+        }
+    }
+    
+    # Quiz questions
+    QUIZ_QUESTIONS = [
+        {
+            'topic': 'crypto',
+            'difficulty': 'easy',
+            'question': 'What is Bitcoin?',
+            'options': [
+                'A digital currency',
+                'A physical coin',
+                'A bank',
+                'A government program'
+            ],
+            'correct_answer': 0,
+            'explanation': 'Bitcoin is a decentralized digital currency that operates without a central bank.'
+        },
+        {
+            'topic': 'crypto',
+            'difficulty': 'medium',
+            'question': 'What is a blockchain?',
+            'options': [
+                'A type of cryptocurrency',
+                'A distributed ledger technology',
+                'A trading platform',
+                'A wallet app'
+            ],
+            'correct_answer': 1,
+            'explanation': 'Blockchain is a distributed ledger technology that maintains a continuously growing list of records.'
+        },
+        {
+            'topic': 'stocks',
+            'difficulty': 'easy',
+            'question': 'What does P/E ratio stand for?',
+            'options': [
+                'Price to Equity',
+                'Price to Earnings',
+                'Profit to Equity',
+                'Profit to Earnings'
+            ],
+            'correct_answer': 1,
+            'explanation': 'P/E ratio stands for Price-to-Earnings ratio, which compares stock price to earnings per share.'
+        },
+        {
+            'topic': 'stocks',
+            'difficulty': 'medium',
+            'question': 'What is market capitalization?',
+            'options': [
+                'Total debt of a company',
+                'Total value of company shares',
+                'Annual revenue',
+                'Number of employees'
+            ],
+            'correct_answer': 1,
+            'explanation': 'Market cap is the total value of all company shares, calculated as share price × number of shares.'
+        }
+    ]
+    
+    # Daily learning tips
+    DAILY_TIPS = (
+        "💡 **Daily Tip**: Always do your own research before making any investment decisions!",
+        "💡 **Daily Tip**: Dollar-cost averaging can help reduce the impact of market volatility.",
+        "💡 **Daily Tip**: Diversification is your best friend in investing - don't put all eggs in one basket!",
+        "💡 **Daily Tip**: The best time to invest was yesterday, the second best time is now - but only after proper research!",
+        "💡 **Daily Tip**: Never invest money you can't afford to lose, especially in volatile markets.",
+        "💡 **Daily Tip**: Emotional trading is often the enemy of profitable trading. Stay disciplined!",
+        "💡 **Daily Tip**: Understanding compound interest is crucial for long-term wealth building.",
+        "💡 **Daily Tip**: Keep learning! The markets are always evolving, and so should your knowledge."
+    )
+    
+    # Quiz questions indexed for topic lookups and random selection
+    _QUIZZES_BY_TOPIC = _index_by_topic(QUIZ_QUESTIONS)
+    _QUIZ_CHOICES = tuple(QUIZ_QUESTIONS)
+    
+    def get_learning_modules(self) -> Dict:
+        """Get all learning modules"""
+        return self.LEARNING_MODULES
+    
+    def get_module_content(self, module_id: str) -> str:
+        """Get content for a specific module"""
+        module = self.LEARNING_MODULES.get(module_id)
+        if module:
+            return module['content']
+        return "Module not found."
+    
+    def get_crypto_basics(self) -> str:
+        """Get cryptocurrency basics content"""
+        return _CRYPTO_BASICS_CONTENT
+    
+    def get_stocks_basics(self) -> str:
+        """Get stocks basics content"""
+        return _STOCKS_BASICS_CONTENT
+    
+    def get_blockchain_content(self) -> str:
+        """Get blockchain content"""
+        return _BLOCKCHAIN_CONTENT
+    
+    def get_technical_analysis_content(self) -> str:
+        """Get technical analysis content"""  
+        return _TECHNICAL_ANALYSIS_CONTENT
+    
+    def get_risk_management_content(self) -> str:
+        """Get risk management content"""
+        return _RISK_MANAGEMENT_CONTENT
     
     def get_random_quiz(self) -> Dict:
         """Get a random quiz question"""
-        return random.choice(self.quiz_questions)
+        return random.choice(self._QUIZ_CHOICES)
     
     def get_quiz_by_topic(self, topic: str) -> List[Dict]:
         """Get quiz questions for a specific topic"""
-        return [q for q in self.quiz_questions if q['topic'] == topic]
+        # A copy, so callers can't change the shared index
+        return list(self._QUIZZES_BY_TOPIC.get(topic, ()))
     
     def get_daily_tip(self) -> str:
-        """Get a daily learning tip"""
-        tips = [
-            "💡 **Daily Tip**: Always do your own research before making any investment decisions!",
-            "💡 **Daily Tip**: Dollar-cost averaging can help reduce the impact of market volatility.",
-            "💡 **Daily Tip**: Diversification is your best friend in investing - don't put all eggs in one basket!",
-            "💡 **Daily Tip**: The best time to invest was yesterday, the second best time is now - but only after proper research!",
-            "💡 **Daily Tip**: Never invest money you can't afford to lose, especially in volatile markets.",
-            "💡 **Daily Tip**: Emotional trading is often the enemy of profitable trading. Stay disciplined!",
-            "💡 **Daily Tip**: Understanding compound interest is crucial for long-term wealth building.",
-            "💡 **Daily Tip**: Keep learning! The markets are always evolving, and so should your knowledge."
-        ]
-        return random.choice(tips)
+        """Get a daily learning tip, the same one for the whole day"""
+        return self.DAILY_TIPS[date.today().toordinal() % len(self.DAILY_TIPS)]
@@ -14,9 +14,67 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+_SYSTEM_INSTRUCTION = """
+You are a friendly AI assistant with expertise in cryptocurrency, stock trading, and general conversation. Your role is to:
+
+1. For crypto/stocks topics: Provide accurate, educational information with safety-focused advice
+2. For general conversation: Be helpful, engaging, and supportive on any topic
+3. Break down complex concepts into easy-to-understand explanations
+4. Be encouraging and maintain a conversational, friendly tone
+5. Use examples and analogies to make learning easier
+6. Encourage questions and deeper exploration
+7. Always prioritize helpful, accurate responses
+
+You can discuss anything - from crypto and stocks to daily life, hobbies, technology, or any other topics users want to chat about. Be a supportive conversation companion.
+"""
+
+_QUIZ_PROMPT_TEMPLATE = """
+Generate a {difficulty} level multiple choice quiz question about {topic}.
+
+Format your response as:
+Question: [your question]
+A) [option 1]
+B) [option 2] 
+C) [option 3]
+D) [option 4]
+Correct Answer: [A/B/C/D]
+Explanation: [brief explanation of why this is correct]
+
+Make sure the question is educational and helps reinforce learning.
+"""
+
+_EXPLAIN_PROMPT_TEMPLATE = """
+Explain the concept of "{concept}" in cryptocurrency or stock trading to a {user_level} level learner.
+
+Guidelines:
+- Use simple, clear language appropriate for {user_level} level
+- Include practical examples
+- Use analogies if helpful
+- Be encouraging and supportive
+- Use emojis and formatting for engagement
+- Keep it concise but comprehensive
+"""
+
+# Request configs are immutable, so build them once
+if types:
+    _EDUCATIONAL_CONFIG = types.GenerateContentConfig(
+        system_instruction=_SYSTEM_INSTRUCTION,
+        temperature=0.7,
+        max_output_tokens=1000
+    )
+    _EXPLAIN_CONFIG = types.GenerateContentConfig(
+        temperature=0.6,
+        max_output_tokens=800
+    )
+else:
+    _EDUCATIONAL_CONFIG = None
+    _EXPLAIN_CONFIG = None
+
 class GeminiClient:
     """Client for interacting with Gemini Pro AI"""
     
+    __slots__ = ('client', 'model')
+    
     def __init__(self):
         if not genai:
             logger.error("Google GenAI library not available")
@@ -33,30 +91,12 @@ class GeminiClient:
     async def get_educational_response(self, prompt):
         """Get educational response from Gemini AI"""
         try:
-            system_instruction = """
-You are a friendly AI assistant with expertise in cryptocurrency, stock trading, and general conversation. Your role is to:
-
-1. For crypto/stocks topics: Provide accurate, educational information with safety-focused advice
-2. For general conversation: Be helpful, engaging, and supportive on any topic
-3. Break down complex concepts into easy-to-understand explanations
-4. Be encouraging and maintain a conversational, friendly tone
-5. Use examples and analogies to make learning easier
-6. Encourage questions and deeper exploration
-7. Always prioritize helpful, accurate responses
-
-You can discuss anything - from crypto and stocks to daily life, hobbies, technology, or any other topics users want to chat about. Be a supportive conversation companion.
-            """
-            
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                 model=self.model,
                 contents=[
                     types.Content(role="user", parts=[types.Part(text=prompt)])
                 ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=0.7,
-                    max_output_tokens=1000
-                )
+                config=_EDUCATIONAL_CONFIG
             )
             
             return response.text if response.text else "I'm having trouble processing that right now. Could you try rephrasing your question?"
@@ -65,25 +105,39 @@ You can discuss anything - from crypto and stocks to daily life, hobbies, techno
             logger.error(f"Error getting Gemini response: {e}")
             return "😅 I'm experiencing some technical difficulties. Please try again in a moment!"
     
+    async def stream_educational_response(self, prompt):
+        """Stream an educational response from Gemini AI as text chunks"""
+        streamed = False
+        try:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model,
+                contents=[
+                    types.Content(role="user", parts=[types.Part(text=prompt)])
+                ],
+                config=_EDUCATIONAL_CONFIG
+            )
+            
+            async for chunk in stream:
+                if chunk.text:
+                    streamed = True
+                    yield chunk.text
+            
+            if not streamed:
+                yield "I'm having trouble processing that right now. Could you try rephrasing your question?"
+            
+        except Exception as e:
+            logger.error(f"Error streaming Gemini response: {e}")
+            # Keep whatever part of the answer already reached the user
+            if not streamed:
+                yield "😅 I'm experiencing some technical difficulties. Please try again in a moment!"
+    
     async def generate_quiz_question(self, topic, difficulty='medium'):
         """Generate a quiz question on a specific topic"""
         try:
-            prompt = f"""
-Generate a {difficulty} level multiple choice quiz question about {topic}.
-
-Format your response as:
-Question: [your question]
-A) [option 1]
-B) [option 2] 
-C) [option 3]
-D) [option 4]
-Correct Answer: [A/B/C/D]
-Explanation: [brief explanation of why this is correct]
-
-Make sure the question is educational and helps reinforce learning.
-            """
+            prompt = _QUIZ_PROMPT_TEMPLATE.format(topic=topic,
+                                                  difficulty=difficulty)
             
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                 model=self.model,
                 contents=prompt
             )
@@ -97,25 +151,13 @@ Make sure the question is educational and helps reinforce learning.
     async def explain_concept(self, concept, user_level='beginner'):
         """Explain a concept based on user's learning level"""
         try:
-            prompt = f"""
-Explain the concept of "{concept}" in cryptocurrency or stock trading to a {user_level} level learner.
-
-Guidelines:
-- Use simple, clear language appropriate for {user_level} level
-- Include practical examples
-- Use analogies if helpful
-- Be encouraging and supportive
-- Use emojis and formatting for engagement
-- Keep it concise but comprehensive
-            """
+            prompt = _EXPLAIN_PROMPT_TEMPLATE.format(concept=concept,
+                                                     user_level=user_level)
             
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                 model=self.model,
                 contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.6,
-                    max_output_tokens=800
-                )
+                config=_EXPLAIN_CONFIG
             )
             
             return response.text if response.text else "I couldn't generate an explanation right now. Please try again!"
@@ -123,3 +165,12 @@ Guidelines:
         except Exception as e:
             logger.error(f"Error explaining concept: {e}")
             return "Sorry, I'm having trouble explaining that concept right now."
+
+_gemini_client = None
+
+def get_gemini_client() -> GeminiClient:
+    """Get the shared Gemini client, creating it on first use"""
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = GeminiClient()
+    return _gemini_client
@@ -4,57 +4,86 @@ Crypto & Stocks Educational Telegram Bot with Gemini Pro AI
 Features: Persistent memory, progress tracking, educational content
 """
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import re
 import asyncio
+import time
 from datetime import datetime
 from telegram import Update, BotCommand
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, filters, ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import TelegramError
 
-from bot_config import BotConfig
-from gemini_client import GeminiClient
+from bot_config import get_bot_config
+from gemini_client import get_gemini_client
 from data_manager import DataManager
 from educational_content import EducationalContent
 from user_manager import UserManager
 from progress_tracker import ProgressTracker
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO)
+# Configure logging. Handlers only enqueue records, and a listener thread
+# writes them out so slow log output never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_root_logger = logging.getLogger()
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_root_logger.setLevel(logging.INFO)
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+# Registered first, so it runs last and writes out records logged at exit
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
+# Markdown stripped from replies by _clean_markdown_response, matched in a
+# single pass. Code blocks come first so they win over inline code.
+_RE_MARKDOWN = re.compile(r'(?P<code_block>```[^`]*```)'
+                          r'|\*\*(?P<bold>[^*]+)\*\*'
+                          r'|\*(?P<italic>[^*]+)\*'
+                          r'|`(?P<inline_code>[^`]+)`'
+                          r'|\[(?P<link>[^\]]+)\]\([^)]+\)')
 
-class CryptoStocksBot:
 
-    def __init__(self):
-        self.config = BotConfig()
-        self.gemini = GeminiClient()
-        self.data_manager = DataManager()
-        self.educational_content = EducationalContent()
-        self.user_manager = UserManager(self.data_manager)
-        self.progress_tracker = ProgressTracker(self.data_manager)
+def _replace_markdown(match):
+    """Replace one markdown match with its plain-text equivalent"""
+    kind = match.lastgroup
+    if kind == 'code_block':
+        return '[code block]'
 
-    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Start command handler"""
-        if not update.effective_user or not update.effective_chat:
-            return
+    # Clean markdown nested inside the matched text as well
+    text = _RE_MARKDOWN.sub(_replace_markdown, match.group(kind))
+    if kind == 'inline_code':
+        return f'"{text}"'
+    return text
 
-        user = update.effective_user
-        chat_id = update.effective_chat.id
 
-        # Register user
-        user_info = self.user_manager.register_user(user_id=user.id,
-                                                    username=user.username
-                                                    or "",
-                                                    first_name=user.first_name
-                                                    or "Unknown",
-                                                    chat_id=chat_id)
+# Chat types in which the bot only answers when addressed
+_GROUP_CHAT_TYPES = frozenset({'group', 'supergroup'})
+
+# Number of past conversations included in the prompt
+_RECENT_MEMORIES = 5
+
+# Commands that open a learning module under a shorter name
+_MODULE_COMMAND_ALIASES = {'crypto': 'crypto_basics', 'stocks': 'stocks_basics'}
+
+# Seconds between edits of a reply while it streams in; groups allow only
+# 20 messages a minute, edits included
+_STREAM_EDIT_INTERVAL = 1.0
+_GROUP_STREAM_EDIT_INTERVAL = 3.0
+
+# Most conversations saved together, and seconds spent collecting them
+_WRITE_BATCH_SIZE = 100
+_WRITE_BATCH_INTERVAL = 0.05
 
-        welcome_message = f"""🚀 Welcome to Crypto & Stocks Learning Bot! 
+# Welcome message for /start, formatted with the user's display name
+_WELCOME_TEMPLATE = """🚀 Welcome to Crypto & Stocks Learning Bot! 
 
-Hey {user_info['display_name']}! I'm Ayaka, your friendly AI tutor powered by Gemini Pro. I'm here to help you learn about cryptocurrency and stock trading! 
+Hey {display_name}! I'm Ayaka, your friendly AI tutor powered by Gemini Pro. I'm here to help you learn about cryptocurrency and stock trading! 
 
 🎯 What I can do:
 • Teach you crypto and stocks fundamentals
@@ -74,16 +103,8 @@ Hey {user_info['display_name']}! I'm Ayaka, your friendly AI tutor powered by Ge
 
 Let's start your financial education journey! What would you like to learn about first?"""
 
-        if update.message:
-            clean_welcome = self._clean_markdown_response(welcome_message)
-            await update.message.reply_text(clean_welcome)
-
-    async def help_command(self, update: Update,
-                           context: ContextTypes.DEFAULT_TYPE):
-        """Help command handler"""
-        if not update.message:
-            return
-        help_text = """
+# Command overview for /help
+_HELP_TEXT = """
 🤖 **Crypto & Stocks Learning Bot - Commands**
 
 **Learning Commands:**
@@ -110,57 +131,183 @@ Let's start your financial education journey! What would you like to learn about
 💡 **Tip:** You can also just chat with me naturally! Call me Ayaka and I'll remember our conversations and help you learn step by step.
         """
 
-        clean_help = self._clean_markdown_response(help_text)
-        await update.message.reply_text(clean_help)
 
-    async def learn_command(self, update: Update,
-                            context: ContextTypes.DEFAULT_TYPE):
-        """Learning modules command"""
-        if not update.effective_user or not update.message:
-            return
-        user_id = update.effective_user.id
-        modules = self.educational_content.get_learning_modules()
-        user_progress = self.progress_tracker.get_user_progress(user_id)
+# Gemini prompt, with the group chat block filled in once per chat type
+_CONTEXT_PROMPT_TEMPLATE = """
+You are Ayaka, a friendly AI assistant with expertise in cryptocurrency, stock trading, and general conversation. Your name is Ayaka and you should introduce yourself as such when appropriate. {chat_context}
 
-        message = "📚 **Available Learning Modules:**\n\n"
+Current User Information:
+- Name: {display_name}
+- Learning Progress: {overall_score}% complete
+- Completed Modules: {completed_modules}
+- Recent Topics: {recent_topics}
 
-        for module_id, module in modules.items():
-            status = "✅" if module_id in user_progress.get(
-                'completed_modules', []) else "📖"
-            message += f"{status} {module['title']}\n"
-            message += f"   - {module['description']}\n"
-            message += f"   - Use: /{module_id}\n\n"
+Recent Conversation History:
+{memories}
 
-        clean_message = self._clean_markdown_response(message)
-        await update.message.reply_text(clean_message)
+Current Message: {current_message}
 
-    async def crypto_command(self, update: Update,
-                             context: ContextTypes.DEFAULT_TYPE):
-        """Cryptocurrency learning command"""
-        if not update.effective_user or not update.message:
+Guidelines:
+1. For crypto/stocks topics: Provide accurate, educational information with safety-focused advice
+2. For general conversation: Be helpful, engaging, and supportive on any topic
+3. Remember context from previous conversations (both group and individual)
+4. Be encouraging and maintain a conversational, friendly tone
+5. You can discuss anything - from crypto and stocks to daily life, hobbies, technology, or any other topics
+6. In group chats, acknowledge the friend dynamics and shared conversations
+7. Always prioritize helpful, accurate responses
+
+Please respond considering the conversation history and context.
+        """
+
+_GROUP_CHAT_CONTEXT = """
+IMPORTANT: You are in a group chat with friends. Remember the context of group conversations between:
+- Extreme (bot owner/admin)
+- Neel (@Er_Stranger) 
+- Nex (@Nexxxyzz)
+- Pramod (@pr_amod18)
+
+When they reference previous conversations or inside jokes, acknowledge them. Be part of their friend group while maintaining your helpful nature.
+"""
+
+_PRIVATE_PROMPT_TEMPLATE = _CONTEXT_PROMPT_TEMPLATE.replace(
+    '{chat_context}', '')
+_GROUP_PROMPT_TEMPLATE = _CONTEXT_PROMPT_TEMPLATE.replace(
+    '{chat_context}', _GROUP_CHAT_CONTEXT)
+
+
+class CryptoStocksBot:
+
+    __slots__ = ('config', 'gemini', 'data_manager', 'educational_content',
+                 'user_manager', 'progress_tracker', '_welcome_template',
+                 '_help_text', '_modules_header', '_module_entries',
+                 '_module_content', 'command_table', '_bot_mention',
+                 '_write_queue', '_write_task', '_write_batch')
+
+    def __init__(self):
+        self.config = get_bot_config()
+        self.gemini = get_gemini_client()
+        self.data_manager = DataManager()
+        self.educational_content = EducationalContent()
+        self.user_manager = UserManager(self.data_manager)
+        self.progress_tracker = ProgressTracker(self.data_manager)
+
+        # Static replies are cleaned once instead of on every command
+        self._welcome_template = self._clean_markdown_response(
+            _WELCOME_TEMPLATE)
+        self._help_text = self._clean_markdown_response(_HELP_TEXT)
+        self._modules_header = self._clean_markdown_response(
+            "📚 **Available Learning Modules:**\n\n")
+        self._module_entries = [
+            (module_id,
+             self._clean_markdown_response(
+                 f" {module['title']}\n"
+                 f"   - {module['description']}\n"
+                 f"   - Use: /{module_id}\n\n"))
+            for module_id, module in
+            self.educational_content.get_learning_modules().items()
+        ]
+        self._module_content = {
+            module_id: self._clean_markdown_response(module['content'])
+            for module_id, module in
+            self.educational_content.get_learning_modules().items()
+        }
+
+        # Learning commands, all served by a single dispatching handler
+        self.command_table = {
+            'learn': self.learn_command,
+            'progress': self.progress_command,
+            'quiz': self.quiz_command,
+            'reset': self.reset_command
+        }
+        for module_id in self._module_content:
+            self.command_table[module_id] = self.module_command(module_id)
+        for alias, module_id in _MODULE_COMMAND_ALIASES.items():
+            self.command_table[alias] = self.command_table[module_id]
+
+        # Lowercased "@username" of the bot, set in setup_bot_commands
+        self._bot_mention = None
+
+        # Conversations waiting to be saved by the background writer
+        self._write_queue = asyncio.Queue()
+        self._write_task = None
+
+        # Conversations the writer took off the queue but hasn't saved yet
+        self._write_batch = []
+
+    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Start command handler"""
+        if not update.effective_user or not update.effective_chat:
             return
-        user_id = update.effective_user.id
-        content = self.educational_content.get_crypto_basics()
 
-        self.progress_tracker.update_progress(user_id, 'crypto_basics',
-                                              'started')
+        user = update.effective_user
+        chat_id = update.effective_chat.id
 
-        clean_content = self._clean_markdown_response(content)
-        await update.message.reply_text(clean_content)
+        # Register user
+        user_info = await asyncio.to_thread(self.user_manager.register_user,
+                                            user_id=user.id,
+                                            username=user.username or "",
+                                            first_name=user.first_name
+                                            or "Unknown",
+                                            chat_id=chat_id)
 
-    async def stocks_command(self, update: Update,
-                             context: ContextTypes.DEFAULT_TYPE):
-        """Stock trading learning command"""
+        if update.message:
+            await update.message.reply_text(
+                self._welcome_template.format(
+                    display_name=user_info['display_name']))
+
+    async def help_command(self, update: Update,
+                           context: ContextTypes.DEFAULT_TYPE):
+        """Help command handler"""
+        if not update.message:
+            return
+        await update.message.reply_text(self._help_text)
+
+    async def learn_command(self, update: Update,
+                            context: ContextTypes.DEFAULT_TYPE):
+        """Learning modules command"""
         if not update.effective_user or not update.message:
             return
         user_id = update.effective_user.id
-        content = self.educational_content.get_stocks_basics()
+        user_progress = await asyncio.to_thread(
+            self.progress_tracker.get_user_progress, user_id)
+        completed_modules = user_progress.get('completed_modules', [])
 
-        self.progress_tracker.update_progress(user_id, 'stocks_basics',
-                                              'started')
+        # Only the status icons depend on the user
+        parts = [self._modules_header]
 
-        clean_content = self._clean_markdown_response(content)
-        await update.message.reply_text(clean_content)
+        for module_id, entry in self._module_entries:
+            status = "✅" if module_id in completed_modules else "📖"
+            parts.append(status)
+            parts.append(entry)
+
+        await update.message.reply_text("".join(parts))
+
+    async def dispatch_command(self, update: Update,
+                               context: ContextTypes.DEFAULT_TYPE):
+        """Run the learning command named in the message"""
+        message = update.effective_message
+        if not message or not message.text:
+            return
+        # "/Command@BotName args" -> "command"
+        command = message.text.split(maxsplit=1)[0][1:].split('@')[0].lower()
+        handler = self.command_table.get(command)
+        if handler:
+            await handler(update, context)
+
+    def module_command(self, module_id: str):
+        """Create the command handler for a learning module"""
+
+        async def handler(update: Update,
+                          context: ContextTypes.DEFAULT_TYPE):
+            """Learning module command"""
+            if not update.effective_user or not update.message:
+                return
+            await update.message.reply_text(self._module_content[module_id])
+            await asyncio.to_thread(self.progress_tracker.update_progress,
+                                    update.effective_user.id, module_id,
+                                    'started')
+
+        return handler
 
     async def progress_command(self, update: Update,
                                context: ContextTypes.DEFAULT_TYPE):
@@ -168,28 +315,32 @@ Let's start your financial education journey! What would you like to learn about
         if not update.effective_user or not update.message:
             return
         user_id = update.effective_user.id
-        user_info = self.user_manager.get_user_info(user_id)
-        progress = self.progress_tracker.get_user_progress(user_id)
+        user_info, progress = await asyncio.gather(
+            asyncio.to_thread(self.user_manager.get_user_info, user_id),
+            asyncio.to_thread(self.progress_tracker.get_user_progress,
+                              user_id))
 
         display_name = user_info.get('display_name', 'Student')
 
-        message = f"📊 Learning Progress for {display_name}\n\n"
-        message += f"🎯 Overall Progress: {progress.get('overall_score', 0)}%\n"
-        message += f"📅 Days Learning: {progress.get('days_active', 0)}\n"
-        message += f"🏆 Completed Modules: {len(progress.get('completed_modules', []))}\n"
-        message += f"❓ Quizzes Taken: {progress.get('quizzes_completed', 0)}\n\n"
+        parts = [
+            f"📊 Learning Progress for {display_name}\n\n",
+            f"🎯 Overall Progress: {progress.get('overall_score', 0)}%\n",
+            f"📅 Days Learning: {progress.get('days_active', 0)}\n",
+            f"🏆 Completed Modules: {len(progress.get('completed_modules', []))}\n",
+            f"❓ Quizzes Taken: {progress.get('quizzes_completed', 0)}\n\n"
+        ]
 
         if progress.get('recent_topics'):
-            message += "📚 Recent Topics:\n"
-            for topic in progress['recent_topics'][-5:]:
-                message += f"• {topic}\n"
+            parts.append("📚 Recent Topics:\n")
+            parts.extend(f"• {topic}\n"
+                         for topic in progress['recent_topics'][-5:])
 
         if progress.get('achievements'):
-            message += "\n🏅 Achievements:\n"
-            for achievement in progress['achievements']:
-                message += f"🏆 {achievement}\n"
+            parts.append("\n🏅 Achievements:\n")
+            parts.extend(f"🏆 {achievement}\n"
+                         for achievement in progress['achievements'])
 
-        clean_message = self._clean_markdown_response(message)
+        clean_message = self._clean_markdown_response("".join(parts))
         await update.message.reply_text(clean_message)
 
     async def quiz_command(self, update: Update,
@@ -199,15 +350,12 @@ Let's start your financial education journey! What would you like to learn about
             return
         quiz_question = self.educational_content.get_random_quiz()
 
-        message = f"🧠 Quiz Time!\n\n"
-        message += f"Question: {quiz_question['question']}\n\n"
-
-        for i, option in enumerate(quiz_question['options'], 1):
-            message += f"{i}. {option}\n"
+        parts = ["🧠 Quiz Time!\n\n", f"Question: {quiz_question['question']}\n\n"]
+        parts.extend(f"{i}. {option}\n"
+                     for i, option in enumerate(quiz_question['options'], 1))
+        parts.append("\n💡 Reply with the number of your answer!")
 
-        message += f"\n💡 Reply with the number of your answer!"
-
-        clean_message = self._clean_markdown_response(message)
+        clean_message = self._clean_markdown_response("".join(parts))
         await update.message.reply_text(clean_message)
 
     async def reset_command(self, update: Update,
@@ -216,46 +364,28 @@ Let's start your financial education journey! What would you like to learn about
         if not update.effective_user or not update.message:
             return
         user_id = update.effective_user.id
-        self.progress_tracker.reset_user_progress(user_id)
+        await asyncio.to_thread(self.progress_tracker.reset_user_progress,
+                                user_id)
 
         reset_message = "Progress Reset Complete! Your learning progress has been reset. Ready to start fresh! Use /learn to begin again."
         await update.message.reply_text(reset_message)
 
-    # Learning module specific handlers
-    async def blockchain_command(self, update: Update,
-                                 context: ContextTypes.DEFAULT_TYPE):
-        """Blockchain learning command"""
-        if not update.effective_user or not update.message:
-            return
-        user_id = update.effective_user.id
-        content = self.educational_content.get_blockchain_content()
-        self.progress_tracker.update_progress(user_id, 'blockchain', 'started')
-        clean_content = self._clean_markdown_response(content)
-        await update.message.reply_text(clean_content)
-
-    async def technical_analysis_command(self, update: Update,
-                                         context: ContextTypes.DEFAULT_TYPE):
-        """Technical analysis learning command"""
-        if not update.effective_user or not update.message:
-            return
-        user_id = update.effective_user.id
-        content = self.educational_content.get_technical_analysis_content()
-        self.progress_tracker.update_progress(user_id, 'technical_analysis',
-                                              'started')
-        clean_content = self._clean_markdown_response(content)
-        await update.message.reply_text(clean_content)
-
-    async def risk_management_command(self, update: Update,
-                                      context: ContextTypes.DEFAULT_TYPE):
-        """Risk management learning command"""
-        if not update.effective_user or not update.message:
-            return
-        user_id = update.effective_user.id
-        content = self.educational_content.get_risk_management_content()
-        self.progress_tracker.update_progress(user_id, 'risk_management',
-                                              'started')
-        clean_content = self._clean_markdown_response(content)
-        await update.message.reply_text(clean_content)
+    async def _fetch_memories(self, is_group_chat: bool, chat_id: int,
+                              user_id: int) -> list:
+        """Get the conversation history used as context for a chat"""
+        if is_group_chat:
+            # For group chats, get group conversation history
+            group_memories, user_memories = await asyncio.gather(
+                asyncio.to_thread(self.data_manager.get_group_memories,
+                                  chat_id, _RECENT_MEMORIES),
+                asyncio.to_thread(self.data_manager.get_user_memories,
+                                  user_id, _RECENT_MEMORIES))
+            # Combine both for context, including some user history too
+            return group_memories + user_memories
+
+        # For private chats, get individual user memories
+        return await asyncio.to_thread(self.data_manager.get_user_memories,
+                                       user_id, _RECENT_MEMORIES)
 
     async def handle_message(self, update: Update,
                              context: ContextTypes.DEFAULT_TYPE):
@@ -264,17 +394,23 @@ Let's start your financial education journey! What would you like to learn about
             return
 
         message_text = update.message.text
-
-        # In group chats, only respond if bot is mentioned, replied to, or called by name "Ayaka"
-        if update.message.chat.type in ['group', 'supergroup']:
-            bot_username = context.bot.username
-            is_mentioned = f"@{bot_username}" in message_text if bot_username else False
+        chat_type = update.message.chat.type
+        is_group_chat = chat_type in _GROUP_CHAT_TYPES
+
+        # In group chats, only respond if bot is mentioned, replied to, or called by name "Ayaka".
+        # Most group messages stop here, before any user or memory lookups.
+        if is_group_chat:
+            if self._bot_mention is None and context.bot.username:
+                self._bot_mention = f"@{context.bot.username}".lower()
+
+            lower_text = message_text.lower()
+            is_mentioned = bool(
+                self._bot_mention) and self._bot_mention in lower_text
             is_reply_to_bot = (
                 update.message.reply_to_message
                 and update.message.reply_to_message.from_user
                 and update.message.reply_to_message.from_user.is_bot)
-            is_called_by_name = "ayaka" in message_text.lower(
-            ) or "Ayaka" in message_text
+            is_called_by_name = "ayaka" in lower_text
 
             if not (is_mentioned or is_reply_to_bot or is_called_by_name):
                 return
@@ -283,8 +419,14 @@ Let's start your financial education journey! What would you like to learn about
         user_id = user.id
         chat_id = update.message.chat.id
 
+        # The user, memory and progress lookups don't depend on each other
+        user_info, all_memories, user_progress = await asyncio.gather(
+            asyncio.to_thread(self.user_manager.get_user_info, user_id),
+            self._fetch_memories(is_group_chat, chat_id, user_id),
+            asyncio.to_thread(self.progress_tracker.get_user_progress,
+                              user_id))
+
         # Get user info for display name
-        user_info = self.user_manager.get_user_info(user_id)
         display_name = user_info.get('display_name', user.first_name
                                      or 'Unknown')
 
@@ -295,55 +437,28 @@ Let's start your financial education journey! What would you like to learn about
             'timestamp': datetime.now().isoformat(),
             'user_id': user_id,
             'chat_id': chat_id,
-            'chat_type': update.message.chat.type
+            'chat_type': chat_type
         }
 
-        # Get memories based on chat type
-        if update.message.chat.type in ['group', 'supergroup']:
-            # For group chats, get group conversation history
-            group_memories = self.data_manager.get_group_memories(chat_id)
-            user_memories = self.data_manager.get_user_memories(user_id)
-            # Combine both for context
-            all_memories = group_memories + user_memories[
-                -5:]  # Include some user history too
-        else:
-            # For private chats, get individual user memories
-            all_memories = self.data_manager.get_user_memories(user_id)
-
-        user_progress = self.progress_tracker.get_user_progress(user_id)
-
         # Create context for Gemini with group context
         context_prompt = self._build_context_prompt(user_info, all_memories,
                                                     user_progress,
                                                     message_text,
-                                                    update.message.chat.type)
+                                                    chat_type)
 
         try:
-            # Get AI response
-            ai_response = await self.gemini.get_educational_response(
-                context_prompt)
+            # Get AI response, showing it as it is generated
+            ai_response = await self._stream_reply(
+                update.message, context_prompt,
+                _GROUP_STREAM_EDIT_INTERVAL
+                if is_group_chat else _STREAM_EDIT_INTERVAL)
 
             # Store the conversation with AI response
             conversation_data['ai_response'] = ai_response
 
-            # Store conversation based on chat type
-            if update.message.chat.type in ['group', 'supergroup']:
-                # Store in both group and individual memories
-                self.data_manager.store_group_conversation(
-                    chat_id, conversation_data)
-                self.data_manager.store_conversation(user_id,
-                                                     conversation_data)
-            else:
-                # Store only in individual memories for private chats
-                self.data_manager.store_conversation(user_id,
-                                                     conversation_data)
-
-            # Update user activity
-            self.progress_tracker.update_user_activity(user_id, message_text)
-
-            # Clean the AI response to avoid Markdown parsing issues
-            clean_response = self._clean_markdown_response(ai_response)
-            await update.message.reply_text(clean_response)
+            # The reply doesn't wait for the conversation to be saved
+            self._write_queue.put_nowait((is_group_chat, chat_id, user_id,
+                                          conversation_data, message_text))
 
         except Exception as e:
             logger.error(f"Error getting AI response: {e}")
@@ -352,6 +467,105 @@ Let's start your financial education journey! What would you like to learn about
                     "Sorry, I'm having trouble processing that right now. Please try again in a moment!"
                 )
 
+    async def _stream_reply(self, message, prompt, edit_interval):
+        """Reply with a streamed Gemini response and return its full text"""
+        parts = []
+        reply = None
+        sent_text = None
+        last_edit = time.monotonic()
+
+        async for chunk in self.gemini.stream_educational_response(prompt):
+            parts.append(chunk)
+            if reply and time.monotonic() - last_edit < edit_interval:
+                continue
+
+            # Clean the AI response to avoid Markdown parsing issues. Telegram
+            # trims messages, so whitespace alone never warrants an edit.
+            text = self._clean_markdown_response("".join(parts)).strip()
+            if not text or text == sent_text:
+                continue
+            if reply is None:
+                reply = await message.reply_text(text)
+            else:
+                await self._edit_reply(reply, text)
+            sent_text = text
+            last_edit = time.monotonic()
+
+        ai_response = "".join(parts)
+        clean_response = self._clean_markdown_response(ai_response).strip()
+        if reply is None:
+            await message.reply_text(clean_response)
+        elif clean_response != sent_text:
+            await self._edit_reply(reply, clean_response)
+
+        return ai_response
+
+    async def _edit_reply(self, reply, text):
+        """Edit a streamed reply, keeping what the user already sees on failure"""
+        try:
+            await reply.edit_text(text)
+        except TelegramError as e:
+            # The reply is already out, so the conversation is still saved
+            logger.warning("Error editing streamed reply: %s", e)
+
+    def start_write_flusher(self):
+        """Start saving queued conversations in the background"""
+        self._write_task = asyncio.create_task(self._flush_writes())
+
+    async def stop_write_flusher(self):
+        """Stop the background writer and save what is still queued"""
+        if self._write_task:
+            self._write_task.cancel()
+            try:
+                await self._write_task
+            except asyncio.CancelledError:
+                pass
+            self._write_task = None
+
+        batch, self._write_batch = self._write_batch, []
+        while batch or not self._write_queue.empty():
+            self._drain_write_queue(batch)
+            await asyncio.to_thread(self._store_conversations, batch)
+            batch = []
+
+    async def _flush_writes(self):
+        """Save queued conversations in batches, one worker thread hop each"""
+        while True:
+            self._write_batch = [await self._write_queue.get()]
+            await asyncio.sleep(_WRITE_BATCH_INTERVAL)
+            batch = self._drain_write_queue(self._write_batch)
+            self._write_batch = []
+            await asyncio.to_thread(self._store_conversations, batch)
+
+    def _drain_write_queue(self, batch):
+        """Move queued conversations into batch, up to _WRITE_BATCH_SIZE"""
+        while len(batch) < _WRITE_BATCH_SIZE and not self._write_queue.empty():
+            batch.append(self._write_queue.get_nowait())
+        return batch
+
+    def _store_conversations(self, batch):
+        """Save conversations and the users' activity"""
+        for (is_group_chat, chat_id, user_id, conversation_data,
+             message_text) in batch:
+            try:
+                # Store conversation based on chat type
+                if is_group_chat:
+                    # Store in both group and individual memories
+                    self.data_manager.store_group_conversation(
+                        chat_id, conversation_data)
+                    self.data_manager.store_conversation(
+                        user_id, conversation_data)
+                else:
+                    # Store only in individual memories for private chats
+                    self.data_manager.store_conversation(
+                        user_id, conversation_data)
+
+                # Update user activity
+                self.progress_tracker.update_user_activity(
+                    user_id, message_text)
+            except Exception as e:
+                logger.error(f"Error storing conversation: {e}")
+
     def _build_context_prompt(self,
                               user_info,
                               memories,
@@ -359,93 +573,46 @@ Let's start your financial education journey! What would you like to learn about
                               current_message,
                               chat_type='private'):
         """Build context prompt for Gemini AI"""
-        chat_context = ""
-        if chat_type in ['group', 'supergroup']:
-            chat_context = """
-IMPORTANT: You are in a group chat with friends. Remember the context of group conversations between:
-- Extreme (bot owner/admin)
-- Neel (@Er_Stranger) 
-- Nex (@Nexxxyzz)
-- Pramod (@pr_amod18)
-
-When they reference previous conversations or inside jokes, acknowledge them. Be part of their friend group while maintaining your helpful nature.
-"""
-
-        context = f"""
-You are Ayaka, a friendly AI assistant with expertise in cryptocurrency, stock trading, and general conversation. Your name is Ayaka and you should introduce yourself as such when appropriate. {chat_context}
-
-Current User Information:
-- Name: {user_info.get('display_name', 'Student')}
-- Learning Progress: {user_progress.get('overall_score', 0)}% complete
-- Completed Modules: {len(user_progress.get('completed_modules', []))}
-- Recent Topics: {user_progress.get('recent_topics', [])}
-
-Recent Conversation History:
-{self._format_recent_memories(memories)}
-
-Current Message: {current_message}
-
-Guidelines:
-1. For crypto/stocks topics: Provide accurate, educational information with safety-focused advice
-2. For general conversation: Be helpful, engaging, and supportive on any topic
-3. Remember context from previous conversations (both group and individual)
-4. Be encouraging and maintain a conversational, friendly tone
-5. You can discuss anything - from crypto and stocks to daily life, hobbies, technology, or any other topics
-6. In group chats, acknowledge the friend dynamics and shared conversations
-7. Always prioritize helpful, accurate responses
+        template = (_GROUP_PROMPT_TEMPLATE if chat_type in _GROUP_CHAT_TYPES
+                    else _PRIVATE_PROMPT_TEMPLATE)
 
-Please respond considering the conversation history and context.
-        """
-
-        return context
+        return template.format(
+            display_name=user_info.get('display_name', 'Student'),
+            overall_score=user_progress.get('overall_score', 0),
+            completed_modules=len(user_progress.get('completed_modules', [])),
+            recent_topics=user_progress.get('recent_topics', []),
+            memories=self._format_recent_memories(memories),
+            current_message=current_message)
 
     def _format_recent_memories(self, memories):
         """Format recent conversation memories"""
         if not memories:
             return "No previous conversations"
 
-        recent = memories[-5:] if len(memories) > 5 else memories
-        formatted = []
-
-        for memory in recent:
-            user_name = memory.get('user_name', 'User')
-            user_message = memory.get('user_message', '')
-            ai_response = memory.get('ai_response', '')
-
-            if user_message:
-                formatted.append(f"{user_name}: {user_message}")
-            if ai_response:
-                formatted.append(f"Bot: {ai_response}")
-
-        return "\n".join(formatted)
+        # Slicing copes with histories shorter than _RECENT_MEMORIES
+        return "\n".join(
+            line for memory in memories[-_RECENT_MEMORIES:]
+            for line in (f"{memory.get('user_name', 'User')}: "
+                         f"{memory['user_message']}"
+                         if memory.get('user_message') else None,
+                         f"Bot: {memory['ai_response']}"
+                         if memory.get('ai_response') else None) if line)
 
     def _clean_markdown_response(self, response):
         """Clean markdown formatting that might cause Telegram parsing errors"""
-        import re
-
         # Remove problematic markdown characters that often cause parsing errors
-        # Keep basic formatting but remove complex markdown
-        cleaned = response
-
-        # Remove bold markdown ** that might not be properly closed
-        cleaned = re.sub(r'\*\*([^*]+)\*\*', r'\1', cleaned)
-
-        # Remove italic markdown * that might cause issues
-        cleaned = re.sub(r'\*([^*]+)\*', r'\1', cleaned)
-
-        # Remove code blocks that might cause issues
-        cleaned = re.sub(r'```[^`]*```', r'[code block]', cleaned)
-        cleaned = re.sub(r'`([^`]+)`', r'"\1"', cleaned)
-
-        # Remove links that might cause parsing issues
-        cleaned = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', cleaned)
-
-        return cleaned
+        # Keep basic formatting but remove complex markdown: bold, italics,
+        # code blocks, inline code and links
+        return _RE_MARKDOWN.sub(_replace_markdown, response)
 
     async def error_handler(self, update: object,
                             context: ContextTypes.DEFAULT_TYPE):
         """Error handler"""
-        logger.error(f"Update {update} caused error {context.error}")
+        # Log only the update id; formatting the whole update is expensive
+        logger.error("Update %s caused error %s",
+                     getattr(update, 'update_id', '?'),
+                     context.error,
+                     exc_info=context.error)
 
     async def setup_bot_commands(self, application):
         """Setup bot commands menu"""
@@ -462,6 +629,9 @@ Please respond considering the conversation history and context.
 
         await application.bot.set_my_commands(commands)
 
+        # The bot's username is known once the application is initialized
+        self._bot_mention = f"@{application.bot.username}".lower()
+
 
 def main():
     """Main function to start the bot"""
@@ -474,43 +644,41 @@ def main():
     # Initialize bot
     bot = CryptoStocksBot()
 
-    # Create application
-    application = Application.builder().token(bot_token).build()
+    # Create application, processing updates concurrently so one slow
+    # Gemini call doesn't hold up every other chat, and pacing replies to
+    # stay within Telegram's flood limits instead of running into 429s
+    application = (Application.builder().token(bot_token).rate_limiter(
+        AIORateLimiter(overall_max_rate=30, overall_time_period=1,
+                       max_retries=3)).concurrent_updates(True).build())
 
     # Add handlers
-    application.add_handler(CommandHandler("start", bot.start))
-    application.add_handler(CommandHandler("help", bot.help_command))
-    application.add_handler(CommandHandler("learn", bot.learn_command))
-    application.add_handler(CommandHandler("crypto", bot.crypto_command))
-    application.add_handler(CommandHandler("stocks", bot.stocks_command))
-    application.add_handler(CommandHandler("progress", bot.progress_command))
-    application.add_handler(CommandHandler("quiz", bot.quiz_command))
-    application.add_handler(CommandHandler("reset", bot.reset_command))
-
-    # Add module-specific handlers
-    application.add_handler(CommandHandler("crypto_basics",
-                                           bot.crypto_command))
+    application.add_handler(CommandHandler("start", bot.start, block=False))
     application.add_handler(
-        CommandHandler("blockchain", bot.blockchain_command))
-    application.add_handler(CommandHandler("stocks_basics",
-                                           bot.stocks_command))
+        CommandHandler("help", bot.help_command, block=False))
     application.add_handler(
-        CommandHandler("technical_analysis", bot.technical_analysis_command))
-    application.add_handler(
-        CommandHandler("risk_management", bot.risk_management_command))
+        CommandHandler(list(bot.command_table),
+                       bot.dispatch_command,
+                       block=False))
 
     # Handle all other messages
     application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+        MessageHandler(filters.TEXT & ~filters.COMMAND,
+                       bot.handle_message,
+                       block=False))
 
     # Error handler
     application.add_error_handler(bot.error_handler)
 
-    # Setup commands menu
+    # Setup commands menu and the background conversation writer
     async def post_init(app):
         await bot.setup_bot_commands(app)
+        bot.start_write_flusher()
+
+    async def post_shutdown(app):
+        await bot.stop_write_flusher()
 
     application.post_init = post_init
+    application.post_shutdown = post_shutdown
 
     # Start the bot
     logger.info("Starting Crypto & Stocks Educational Bot...")
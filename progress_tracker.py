@@ -2,31 +2,84 @@
 Progress tracking system for user learning
 """
 
+import heapq
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Set
 
 logger = logging.getLogger(__name__)
 
+# Keywords in a module id that count it towards each skill
+_CRYPTO_KEYWORDS = ('crypto', 'blockchain')
+_STOCKS_KEYWORDS = ('stock', 'trading')
+_TRADING_KEYWORDS = ('trading', 'analysis', 'risk')
+
+# Learning recommendations as (condition, message) pairs in priority order;
+# each condition gets the completed module set, skill levels and progress
+_RECOMMENDATION_RULES = (
+    # Recommend based on completion
+    (lambda completed, skills, progress: 'crypto_basics' not in completed,
+     "Start with Cryptocurrency Basics - perfect for beginners!"),
+    (lambda completed, skills, progress: 'stocks_basics' not in completed,
+     "Learn Stock Market Fundamentals - build your foundation!"),
+    (lambda completed, skills, progress:
+        len(completed) >= 2 and 'risk_management' not in completed,
+     "Study Risk Management - essential for any trader!"),
+    # Recommend based on skill level
+    (lambda completed, skills, progress:
+        skills.get('crypto') == 'beginner' and 'blockchain' not in completed,
+     "Dive deeper with Blockchain Technology module!"),
+    (lambda completed, skills, progress:
+        skills.get('stocks') == 'beginner' and 'technical_analysis' not in completed,
+     "Learn Technical Analysis to read charts like a pro!"),
+    # Always recommend practice
+    (lambda completed, skills, progress: progress.get('quizzes_completed', 0) < 3,
+     "Take more quizzes to test your knowledge!"),
+)
+
+# Number of learning recommendations returned
+_MAX_RECOMMENDATIONS = 3
+
 class ProgressTracker:
     """Tracks user learning progress and achievements"""
     
+    __slots__ = ('data_manager', '_update_lock', '_leaderboard_cache')
+    
+    # Seconds a computed leaderboard is reused while no scores change
+    LEADERBOARD_TTL = 30
+    
+    # Emoji shown next to each skill level; other levels get 🌱
+    _SKILL_LEVEL_EMOJIS = {'advanced': '🌟', 'intermediate': '📈'}
+    
     def __init__(self, data_manager):
         self.data_manager = data_manager
+        
+        # Serializes changes to progress from the bot's worker threads;
+        # reentrant since updates load progress through get_user_progress
+        self._update_lock = threading.RLock()
+        
+        # (computed at, limit, entries) of the last leaderboard
+        self._leaderboard_cache = None
     
     def get_user_progress(self, user_id: int) -> Dict:
         """Get user's learning progress"""
-        progress = self.data_manager.get_user_progress(user_id)
-        
-        # Initialize progress if not exists
-        if not progress:
-            progress = self._initialize_user_progress(user_id)
-            self.data_manager.save_user_progress(user_id, progress)
-        
-        return progress
+        with self._update_lock:
+            # DataManager hands out its cached dict, so updates modify it in place
+            progress = self.data_manager.get_user_progress(user_id)
+            
+            # Initialize progress if not exists
+            if not progress:
+                progress = self._initialize_user_progress(user_id)
+                self.data_manager.save_user_progress(user_id, progress)
+                self._leaderboard_cache = None
+            
+            return progress
     
     def _initialize_user_progress(self, user_id: int) -> Dict:
         """Initialize progress structure for new user"""
+        now = datetime.now().isoformat()
         return {
             'user_id': user_id,
             'overall_score': 0,
@@ -46,118 +99,148 @@ class ProgressTracker:
                 'trading': 'beginner'
             },
             'learning_goals': [],
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
+            'created_at': now,
+            'updated_at': now
         }
     
     def update_progress(self, user_id: int, topic: str, action: str, score: int = 0):
         """Update user progress for a specific topic and action"""
-        progress = self.get_user_progress(user_id)
-        
-        current_time = datetime.now().isoformat()
-        progress['updated_at'] = current_time
-        
-        # Update based on action
-        if action == 'started':
-            if topic not in progress['current_modules']:
-                progress['current_modules'].append(topic)
-        
-        elif action == 'completed':
-            if topic not in progress['completed_modules']:
-                progress['completed_modules'].append(topic)
+        with self._update_lock:
+            progress = self.get_user_progress(user_id)
             
-            if topic in progress['current_modules']:
-                progress['current_modules'].remove(topic)
+            current_time = datetime.now().isoformat()
+            progress['updated_at'] = current_time
             
-            # Award points for completion
-            progress['overall_score'] += 10
-        
-        elif action == 'quiz_completed':
-            progress['quizzes_completed'] += 1
-            progress['total_questions'] += 1
+            # Update based on action, noting the fields achievements depend on
+            changed = set()
+            if action == 'started':
+                if topic not in progress['current_modules']:
+                    progress['current_modules'].append(topic)
             
-            if score > 0:
-                progress['correct_answers'] += score
-                progress['overall_score'] += score * 5
-        
-        # Update recent topics
-        if topic not in progress['recent_topics']:
-            progress['recent_topics'].append(topic)
-        
-        # Keep only last 10 recent topics
-        if len(progress['recent_topics']) > 10:
-            progress['recent_topics'] = progress['recent_topics'][-10:]
-        
-        # Update overall score (cap at 100)
-        progress['overall_score'] = min(progress['overall_score'], 100)
-        
-        # Check for achievements
-        self._check_achievements(progress)
-        
-        # Update skill levels
-        self._update_skill_levels(progress)
-        
-        self.data_manager.save_user_progress(user_id, progress)
+            elif action == 'completed':
+                if topic not in progress['completed_modules']:
+                    progress['completed_modules'].append(topic)
+                    changed.add('completed_modules')
+                
+                if topic in progress['current_modules']:
+                    progress['current_modules'].remove(topic)
+                
+                # Award points for completion
+                progress['overall_score'] += 10
+                changed.add('overall_score')
+            
+            elif action == 'quiz_completed':
+                progress['quizzes_completed'] += 1
+                progress['total_questions'] += 1
+                changed.update(('quizzes_completed', 'total_questions'))
+                
+                if score > 0:
+                    progress['correct_answers'] += score
+                    progress['overall_score'] += score * 5
+                    changed.update(('correct_answers', 'overall_score'))
+            
+            # Update recent topics
+            recent_topics = progress['recent_topics']
+            if topic not in recent_topics:
+                recent_topics.append(topic)
+                
+                # Keep only last 10 recent topics, trimming in place
+                if len(recent_topics) > 10:
+                    del recent_topics[:-10]
+            
+            # Update overall score (cap at 100)
+            progress['overall_score'] = min(progress['overall_score'], 100)
+            
+            if changed:
+                # Check for achievements
+                self._check_achievements(progress, changed)
+                
+                # Update skill levels
+                if 'completed_modules' in changed or 'overall_score' in changed:
+                    self._update_skill_levels(progress)
+                
+                self._leaderboard_cache = None
+            
+            self.data_manager.save_user_progress(user_id, progress)
     
     def update_user_activity(self, user_id: int, message: str):
         """Update user activity tracking"""
-        progress = self.get_user_progress(user_id)
-        
-        current_date = datetime.now().date()
-        last_activity_date = None
-        
-        if progress.get('last_activity'):
-            try:
-                last_activity_date = datetime.fromisoformat(progress['last_activity']).date()
-            except:
-                pass
-        
-        # Update activity tracking
-        if last_activity_date != current_date:
-            progress['days_active'] += 1
+        with self._update_lock:
+            progress = self.get_user_progress(user_id)
+            
+            now = datetime.now()
+            current_date = now.date()
+            last_activity_date = None
+            
+            last_activity = progress.get('last_activity')
+            if last_activity:
+                try:
+                    last_activity_date = datetime.fromisoformat(last_activity).date()
+                except (TypeError, ValueError):
+                    # Not an ISO timestamp; treat the user as new
+                    pass
             
-            # Update learning streak
-            if last_activity_date and (current_date - last_activity_date).days == 1:
-                progress['learning_streak'] += 1
-            elif last_activity_date and (current_date - last_activity_date).days > 1:
-                progress['learning_streak'] = 1
+            # Update activity tracking
+            if last_activity_date != current_date:
+                progress['days_active'] += 1
+                
+                # Update learning streak
+                if last_activity_date and (current_date - last_activity_date).days == 1:
+                    progress['learning_streak'] += 1
+                elif last_activity_date and (current_date - last_activity_date).days > 1:
+                    progress['learning_streak'] = 1
+                else:
+                    progress['learning_streak'] = 1
+                
+                # The streak is only checked for achievements when it changes
+                self._check_achievements(progress, {'learning_streak'})
+                
+                progress['last_activity'] = progress['updated_at'] = now.isoformat()
+                self.data_manager.save_user_progress(user_id, progress)
             else:
-                progress['learning_streak'] = 1
-        
-        progress['last_activity'] = datetime.now().isoformat()
-        progress['updated_at'] = datetime.now().isoformat()
-        
-        self.data_manager.save_user_progress(user_id, progress)
+                # Later messages on the same day only move the timestamps, which
+                # are saved with the next write of this user's progress
+                progress['last_activity'] = progress['updated_at'] = now.isoformat()
     
-    def _check_achievements(self, progress: Dict):
-        """Check and award achievements"""
+    def _check_achievements(self, progress: Dict, changed: Set[str]):
+        """Check and award the achievements that depend on changed fields"""
         achievements = progress.get('achievements', [])
         
-        # First steps achievement
-        if len(progress['completed_modules']) >= 1 and 'First Steps' not in achievements:
-            achievements.append('First Steps')
+        # Each achievement is checked once, so one set lookup per check is enough
+        earned = set(achievements)
         
-        # Knowledge seeker achievement
-        if len(progress['completed_modules']) >= 3 and 'Knowledge Seeker' not in achievements:
-            achievements.append('Knowledge Seeker')
+        if 'completed_modules' in changed:
+            completed_count = len(progress['completed_modules'])
+            
+            # First steps achievement
+            if completed_count >= 1 and 'First Steps' not in earned:
+                achievements.append('First Steps')
+            
+            # Knowledge seeker achievement
+            if completed_count >= 3 and 'Knowledge Seeker' not in earned:
+                achievements.append('Knowledge Seeker')
         
         # Quiz master achievement
-        if progress['quizzes_completed'] >= 5 and 'Quiz Master' not in achievements:
+        if ('quizzes_completed' in changed and progress['quizzes_completed'] >= 5
+                and 'Quiz Master' not in earned):
             achievements.append('Quiz Master')
         
         # Consistent learner achievement
-        if progress['learning_streak'] >= 7 and 'Consistent Learner' not in achievements:
+        if ('learning_streak' in changed and progress['learning_streak'] >= 7
+                and 'Consistent Learner' not in earned):
             achievements.append('Consistent Learner')
         
         # High achiever achievement
-        if progress['overall_score'] >= 80 and 'High Achiever' not in achievements:
+        if ('overall_score' in changed and progress['overall_score'] >= 80
+                and 'High Achiever' not in earned):
             achievements.append('High Achiever')
         
         # Perfect score achievement
-        if (progress['total_questions'] > 0 and 
+        if ('total_questions' in changed and
+            progress['total_questions'] > 0 and 
             progress['correct_answers'] == progress['total_questions'] and
             progress['total_questions'] >= 5 and
-            'Perfect Score' not in achievements):
+            'Perfect Score' not in earned):
             achievements.append('Perfect Score')
         
         progress['achievements'] = achievements
@@ -168,25 +251,33 @@ class ProgressTracker:
         completed_modules = progress.get('completed_modules', [])
         overall_score = progress.get('overall_score', 0)
         
+        # Count the modules of each skill in a single pass
+        crypto_count = stocks_count = trading_count = 0
+        for module in completed_modules:
+            module = module.lower()
+            if any(keyword in module for keyword in _CRYPTO_KEYWORDS):
+                crypto_count += 1
+            if any(keyword in module for keyword in _STOCKS_KEYWORDS):
+                stocks_count += 1
+            if any(keyword in module for keyword in _TRADING_KEYWORDS):
+                trading_count += 1
+        
         # Crypto skill level
-        crypto_modules = [m for m in completed_modules if 'crypto' in m.lower() or 'blockchain' in m.lower()]
-        if len(crypto_modules) >= 3 or overall_score >= 60:
+        if crypto_count >= 3 or overall_score >= 60:
             skill_levels['crypto'] = 'intermediate'
-        if len(crypto_modules) >= 5 or overall_score >= 80:
+        if crypto_count >= 5 or overall_score >= 80:
             skill_levels['crypto'] = 'advanced'
         
         # Stocks skill level
-        stocks_modules = [m for m in completed_modules if 'stock' in m.lower() or 'trading' in m.lower()]
-        if len(stocks_modules) >= 3 or overall_score >= 60:
+        if stocks_count >= 3 or overall_score >= 60:
             skill_levels['stocks'] = 'intermediate'
-        if len(stocks_modules) >= 5 or overall_score >= 80:
+        if stocks_count >= 5 or overall_score >= 80:
             skill_levels['stocks'] = 'advanced'
         
         # Trading skill level
-        trading_modules = [m for m in completed_modules if any(term in m.lower() for term in ['trading', 'analysis', 'risk'])]
-        if len(trading_modules) >= 2 or overall_score >= 50:
+        if trading_count >= 2 or overall_score >= 50:
             skill_levels['trading'] = 'intermediate'
-        if len(trading_modules) >= 4 or overall_score >= 75:
+        if trading_count >= 4 or overall_score >= 75:
             skill_levels['trading'] = 'advanced'
         
         progress['skill_levels'] = skill_levels
@@ -195,83 +286,88 @@ class ProgressTracker:
         """Get formatted progress summary"""
         progress = self.get_user_progress(user_id)
         
-        summary = f"📊 **Your Learning Progress**\n\n"
-        summary += f"🎯 **Overall Score:** {progress['overall_score']}%\n"
-        summary += f"📚 **Completed Modules:** {len(progress['completed_modules'])}\n"
-        summary += f"🔥 **Learning Streak:** {progress['learning_streak']} days\n"
-        summary += f"📅 **Days Active:** {progress['days_active']}\n"
-        summary += f"❓ **Quizzes Completed:** {progress['quizzes_completed']}\n"
+        parts = [
+            "📊 **Your Learning Progress**\n\n",
+            f"🎯 **Overall Score:** {progress['overall_score']}%\n",
+            f"📚 **Completed Modules:** {len(progress['completed_modules'])}\n",
+            f"🔥 **Learning Streak:** {progress['learning_streak']} days\n",
+            f"📅 **Days Active:** {progress['days_active']}\n",
+            f"❓ **Quizzes Completed:** {progress['quizzes_completed']}\n"
+        ]
         
         if progress['total_questions'] > 0:
             accuracy = (progress['correct_answers'] / progress['total_questions']) * 100
-            summary += f"🎯 **Quiz Accuracy:** {accuracy:.1f}%\n"
+            parts.append(f"🎯 **Quiz Accuracy:** {accuracy:.1f}%\n")
         
-        summary += f"\n**📈 Skill Levels:**\n"
-        for skill, level in progress['skill_levels'].items():
-            emoji = "🌟" if level == "advanced" else "📈" if level == "intermediate" else "🌱"
-            summary += f"{emoji} {skill.title()}: {level.title()}\n"
+        parts.append("\n**📈 Skill Levels:**\n")
+        parts.extend(
+            f"{self._SKILL_LEVEL_EMOJIS.get(level, '🌱')} {skill.title()}: {level.title()}\n"
+            for skill, level in progress['skill_levels'].items())
         
         if progress['achievements']:
-            summary += f"\n🏆 **Achievements:**\n"
-            for achievement in progress['achievements']:
-                summary += f"🏅 {achievement}\n"
+            parts.append("\n🏆 **Achievements:**\n")
+            parts.extend(f"🏅 {achievement}\n" for achievement in progress['achievements'])
         
-        return summary
+        return "".join(parts)
     
     def reset_user_progress(self, user_id: int):
         """Reset user's progress"""
-        fresh_progress = self._initialize_user_progress(user_id)
-        self.data_manager.save_user_progress(user_id, fresh_progress)
+        with self._update_lock:
+            fresh_progress = self._initialize_user_progress(user_id)
+            self.data_manager.save_user_progress(user_id, fresh_progress)
+            self._leaderboard_cache = None
+        # Write the reset out right away rather than on the next periodic flush
+        self.flush()
         logger.info(f"Reset progress for user {user_id}")
     
+    def flush(self):
+        """Write buffered progress updates to disk"""
+        self.data_manager.flush()
+    
     def get_leaderboard(self, limit: int = 10) -> List[Dict]:
         """Get top users by progress"""
-        all_progress = self.data_manager.get_progress_data()
-        
-        leaderboard = []
-        for user_id, progress in all_progress.items():
-            user_info = self.data_manager.get_user_data(int(user_id))
-            if user_info:
-                leaderboard.append({
-                    'user_id': user_id,
-                    'display_name': user_info.get('display_name', 'Unknown'),
-                    'overall_score': progress.get('overall_score', 0),
-                    'completed_modules': len(progress.get('completed_modules', [])),
-                    'achievements': len(progress.get('achievements', []))
-                })
-        
-        # Sort by overall score
-        leaderboard.sort(key=lambda x: x['overall_score'], reverse=True)
-        
-        return leaderboard[:limit]
+        cached = self._leaderboard_cache
+        if (cached and cached[1] == limit
+                and time.monotonic() - cached[0] < self.LEADERBOARD_TTL):
+            return list(cached[2])
+        
+        snapshot = self.data_manager.get_snapshot()
+        all_users = snapshot.users
+        
+        # Only registered users are ranked
+        ranked = (
+            (user_id, progress, all_users[user_id])
+            for user_id, progress in snapshot.progress.items()
+            if all_users.get(user_id)
+        )
+        
+        # Select the top entries by overall score without sorting everyone;
+        # ties keep their original order, as with a stable sort
+        top = heapq.nlargest(limit, ranked,
+                             key=lambda entry: entry[1].get('overall_score', 0))
+        
+        leaderboard = [{
+            'user_id': user_id,
+            'display_name': user_info.get('display_name', 'Unknown'),
+            'overall_score': progress.get('overall_score', 0),
+            'completed_modules': len(progress.get('completed_modules', [])),
+            'achievements': len(progress.get('achievements', []))
+        } for user_id, progress, user_info in top]
+        
+        self._leaderboard_cache = (time.monotonic(), limit, leaderboard)
+        return list(leaderboard)
     
     def get_learning_recommendations(self, user_id: int) -> List[str]:
         """Get personalized learning recommendations"""
         progress = self.get_user_progress(user_id)
-        completed = progress.get('completed_modules', [])
+        completed = set(progress.get('completed_modules', []))
         skill_levels = progress.get('skill_levels', {})
         
         recommendations = []
+        for condition, message in _RECOMMENDATION_RULES:
+            if condition(completed, skill_levels, progress):
+                recommendations.append(message)
+                if len(recommendations) == _MAX_RECOMMENDATIONS:
+                    break
         
-        # Recommend based on completion
-        if 'crypto_basics' not in completed:
-            recommendations.append("Start with Cryptocurrency Basics - perfect for beginners!")
-        
-        if 'stocks_basics' not in completed:
-            recommendations.append("Learn Stock Market Fundamentals - build your foundation!")
-        
-        if len(completed) >= 2 and 'risk_management' not in completed:
-            recommendations.append("Study Risk Management - essential for any trader!")
-        
-        # Recommend based on skill level
-        if skill_levels.get('crypto') == 'beginner' and 'blockchain' not in completed:
-            recommendations.append("Dive deeper with Blockchain Technology module!")
-        
-        if skill_levels.get('stocks') == 'beginner' and 'technical_analysis' not in completed:
-            recommendations.append("Learn Technical Analysis to read charts like a pro!")
-        
-        # Always recommend practice
-        if progress.get('quizzes_completed', 0) < 3:
-            recommendations.append("Take more quizzes to test your knowledge!")
-        
-        return recommendations[:3]  # Return top 3 recommendations
+        return recommendations
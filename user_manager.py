@@ -3,54 +3,84 @@ User management system for the bot
 """
 
 import logging
+import threading
+import time
+from types import MappingProxyType
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 
-from bot_config import BotConfig
+from bot_config import get_bot_config
 
 logger = logging.getLogger(__name__)
 
 class UserManager:
     """Manages user registration, identification, and information"""
     
+    __slots__ = ('data_manager', 'config', '_update_lock', '_search_lock',
+                 '_search_index', '_last_seen_written')
+    
+    # Minimum seconds between writes of a user's last seen timestamp
+    LAST_SEEN_WRITE_INTERVAL = 60
+    
+    # Info reported for users who haven't registered yet, read-only since
+    # it is shared by every lookup
+    _DEFAULT_USER_INFO = MappingProxyType({
+        'username': None,
+        'first_name': 'Unknown User',
+        'display_name': 'Unknown User',
+        'is_known_user': False,
+        'role': 'user'
+    })
+    
     def __init__(self, data_manager):
         self.data_manager = data_manager
-        self.config = BotConfig()
+        self.config = get_bot_config()
+        
+        # Serializes changes to user info from the bot's worker threads
+        self._update_lock = threading.Lock()
+        
+        # Lowercased names and user data by user id, built on the first search
+        self._search_index: Optional[Dict[str, Tuple[str, Dict]]] = None
+        self._search_lock = threading.Lock()
+        
+        # When each user's last seen timestamp was last saved
+        self._last_seen_written: Dict[int, float] = {}
     
     def register_user(self, user_id: int, username: str, first_name: str, chat_id: int) -> Dict:
         """Register or update user information"""
-        existing_user = self.data_manager.get_user_data(user_id)
-        
-        # Check if user is in known users list
-        known_user_info = None
-        if username:
+        with self._update_lock:
+            now = datetime.now().isoformat()
+            existing_user = self.data_manager.get_user_data(user_id)
+            
+            # Check if user is in known users list, with or without the @ prefix
             known_user_info = self.config.get_user_by_username(username)
-            if not known_user_info:
-                # Also try with @ prefix if not found
-                known_user_info = self.config.get_user_by_username(f"@{username}")
-        
-        user_data = {
-            'user_id': user_id,
-            'username': username,
-            'first_name': first_name,
-            'chat_id': chat_id,
-            'registration_date': existing_user.get('registration_date', datetime.now().isoformat()),
-            'last_seen': datetime.now().isoformat(),
-            'is_known_user': bool(known_user_info),
-            'role': 'user',
-            'display_name': first_name
-        }
-        
-        # Set special properties for known users
-        if known_user_info:
-            user_data['role'] = known_user_info.get('role', 'user')
-            user_data['display_name'] = known_user_info.get('name', first_name)
-            user_data['known_as'] = known_user_info.get('name')
             
-            logger.info(f"Registered known user: {username} ({known_user_info.get('name')})")
-        
-        # Update user data
-        self.data_manager.save_user_data(user_id, user_data)
+            user_data = {
+                'user_id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'chat_id': chat_id,
+                'registration_date': existing_user.get('registration_date', now),
+                'last_seen': now,
+                'is_known_user': bool(known_user_info),
+                'role': 'user',
+                'display_name': first_name
+            }
+            
+            # Set special properties for known users
+            if known_user_info:
+                user_data['role'] = known_user_info.get('role', 'user')
+                user_data['display_name'] = known_user_info.get('name', first_name)
+                user_data['known_as'] = known_user_info.get('name')
+                
+                logger.info(f"Registered known user: {username} ({known_user_info.get('name')})")
+            
+            # Update user data
+            self.data_manager.save_user_data(user_id, user_data)
+            with self._search_lock:
+                if self._search_index is not None:
+                    self._search_index[str(user_id)] = (self._search_text(user_data),
+                                                        user_data)
         
         return user_data
     
@@ -60,33 +90,32 @@ class UserManager:
         
         if not user_data:
             # Return default user info if not found
-            return {
-                'user_id': user_id,
-                'username': None,
-                'first_name': 'Unknown User',
-                'display_name': 'Unknown User',
-                'is_known_user': False,
-                'role': 'user'
-            }
+            return {'user_id': user_id, **self._DEFAULT_USER_INFO}
         
         return user_data
     
     def update_last_seen(self, user_id: int):
         """Update user's last seen timestamp"""
-        user_data = self.data_manager.get_user_data(user_id)
-        if user_data:
-            user_data['last_seen'] = datetime.now().isoformat()
-            self.data_manager.save_user_data(user_id, user_data)
+        with self._update_lock:
+            user_data = self.data_manager.get_user_data(user_id)
+            if user_data:
+                user_data['last_seen'] = datetime.now().isoformat()
+                
+                # Timestamps in between stay in memory until the next write
+                now = time.monotonic()
+                last_written = self._last_seen_written.get(user_id)
+                if last_written is None or now - last_written >= self.LAST_SEEN_WRITE_INTERVAL:
+                    self._last_seen_written[user_id] = now
+                    self.data_manager.save_user_data(user_id, user_data)
     
     def is_admin(self, user_id: int) -> bool:
         """Check if user is an admin"""
-        user_data = self.get_user_info(user_id)
-        return user_data.get('role') == 'admin'
+        # Unregistered users are never admins, so skip building their defaults
+        return self.data_manager.get_user_data(user_id).get('role') == 'admin'
     
     def is_known_user(self, user_id: int) -> bool:
         """Check if user is in the known users list"""
-        user_data = self.get_user_info(user_id)
-        return user_data.get('is_known_user', False)
+        return self.data_manager.get_user_data(user_id).get('is_known_user', False)
     
     def get_all_users(self) -> Dict:
         """Get all registered users"""
@@ -98,14 +127,15 @@ class UserManager:
         memories = self.data_manager.get_user_memories(user_id)
         progress = self.data_manager.get_user_progress(user_id)
         
-        if user_data.get('registration_date'):
+        days_since_registration = 0
+        registration_date = user_data.get('registration_date')
+        if registration_date:
             try:
-                reg_date = datetime.fromisoformat(user_data['registration_date'])
+                reg_date = datetime.fromisoformat(registration_date)
                 days_since_registration = (datetime.now() - reg_date).days
-            except:
-                days_since_registration = 0
-        else:
-            days_since_registration = 0
+            except (TypeError, ValueError):
+                # Not an ISO timestamp, or one with a timezone
+                pass
         
         return {
             'display_name': user_data.get('display_name', 'Unknown'),
@@ -121,50 +151,55 @@ class UserManager:
     
     def search_users(self, query: str) -> List[Dict]:
         """Search users by username or display name"""
-        all_users = self.get_all_users()
-        results = []
+        with self._search_lock:
+            if self._search_index is None:
+                self._search_index = {
+                    user_id: (self._search_text(user_data), user_data)
+                    for user_id, user_data in self.get_all_users().items()
+                }
+            entries = list(self._search_index.items())
         
         query_lower = query.lower()
         
-        for user_id, user_data in all_users.items():
-            username = user_data.get('username', '').lower()
-            display_name = user_data.get('display_name', '').lower()
-            first_name = user_data.get('first_name', '').lower()
-            
-            if (query_lower in username or 
-                query_lower in display_name or 
-                query_lower in first_name):
-                results.append({
-                    'user_id': user_id,
-                    'username': user_data.get('username'),
-                    'display_name': user_data.get('display_name'),
-                    'is_known_user': user_data.get('is_known_user', False)
-                })
-        
-        return results
+        # One substring test per user against the names lowercased up front
+        return [{
+            'user_id': user_id,
+            'username': user_data.get('username'),
+            'display_name': user_data.get('display_name'),
+            'is_known_user': user_data.get('is_known_user', False)
+        } for user_id, (search_text, user_data) in entries
+          if query_lower in search_text]
+    
+    def _search_text(self, user_data: Dict) -> str:
+        """Get the lowercased names a user can be found by, NUL separated"""
+        return '\0'.join((user_data.get('username') or '',
+                          user_data.get('display_name') or '',
+                          user_data.get('first_name') or '')).lower()
     
     def get_known_users_summary(self) -> str:
         """Get a summary of all known users"""
-        all_users = self.get_all_users()
+        # Shares its bulk read with a leaderboard built around the same time
+        snapshot = self.data_manager.get_snapshot()
         known_users = []
         
-        for user_id, user_data in all_users.items():
+        for user_id, user_data in snapshot.users.items():
             if user_data.get('is_known_user'):
-                stats = self.get_user_stats(int(user_id))
+                # Only the score is shown, so skip the rest of get_user_stats
+                progress = snapshot.progress.get(user_id, {})
                 known_users.append({
                     'display_name': user_data.get('display_name'),
                     'username': user_data.get('username'),
                     'role': user_data.get('role'),
-                    'progress': stats['learning_progress']
+                    'progress': progress.get('overall_score', 0)
                 })
         
         if not known_users:
             return "No known users have interacted with the bot yet."
         
-        summary = "👥 **Known Users Summary:**\n\n"
+        parts = ["👥 **Known Users Summary:**\n\n"]
         for user in known_users:
             role_emoji = "👑" if user['role'] == 'admin' else "📚"
-            summary += f"{role_emoji} **{user['display_name']}** (@{user['username']})\n"
-            summary += f"   └ Progress: {user['progress']}%\n\n"
+            parts.append(f"{role_emoji} **{user['display_name']}** (@{user['username']})\n"
+                         f"   └ Progress: {user['progress']}%\n\n")
         
-        return summary
+        return "".join(parts)